@@ -56,6 +56,22 @@ const config = {
     port: parseInt(getEnvVar('MEMCACHED_PORT', '11211'), 10),
   },
 
+  // SSL/TLS scanner worker pool (persistent ssl_vuln_scanner.py --serve processes)
+  sslScanner: {
+    workers: parseInt(getEnvVar('SSL_SCANNER_WORKERS', '2'), 10),
+    jobTimeoutMs: parseInt(getEnvVar('SSL_SCANNER_JOB_TIMEOUT_MS', '90000'), 10),
+    // Add per-probe connect/handshake/total durations to every scan result
+    timings: getEnvVar('SSL_SCANNER_TIMINGS', 'false') === 'true',
+    // Result cache: store is memory, disk, memcached or none
+    cache: {
+      store: getEnvVar('SSL_SCAN_CACHE_STORE', 'memory'),
+      freshTtl: parseInt(getEnvVar('SSL_SCAN_CACHE_TTL', '3600'), 10), // seconds
+      staleTtl: parseInt(getEnvVar('SSL_SCAN_CACHE_STALE_TTL', '86400'), 10), // seconds served stale while rescanning
+      maxEntries: parseInt(getEnvVar('SSL_SCAN_CACHE_MAX_ENTRIES', '500'), 10),
+      dir: getEnvVar('SSL_SCAN_CACHE_DIR', '/tmp/evilapi-ssl-scan-cache'),
+    },
+  },
+
   // Rate limiting configuration
   rateLimitConfig: {
     windowMs: parseInt(getEnvVar('RATE_LIMIT_WINDOW_MS', '900000'), 10), // 15 minutes
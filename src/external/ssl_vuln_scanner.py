@@ -4,13 +4,190 @@ import json
 import socket
 import ssl
 import datetime
+import hashlib
 import re
+import time
+import threading
+import argparse
 import traceback
-from urllib.parse import urlparse
+from contextlib import contextmanager, nullcontext
+from functools import partial
+from urllib.parse import urljoin, urlparse
+
+import tls_hello
+
+# Whole-scan deadline in seconds; probes still running when it passes are reported as "timed out"
+SCAN_DEADLINE = 30
+# Maximum number of probes allowed to hold a connection to the same address at once
+MAX_CONNECTIONS_PER_HOST = 6
+# Maximum number of scans a --serve worker runs at the same time
+SERVE_MAX_JOBS = 4
+# --batch defaults: targets scanned at once overall, and at once against the same host
+BATCH_CONCURRENCY = 16
+BATCH_PER_HOST = 2
+# With a per-host limit, up to this many times the concurrency of jobs are read ahead, so
+# targets queued behind a busy host do not keep other hosts' targets from running
+BATCH_LOOKAHEAD = 4
+# Reachability gate: seconds the first connection and the first ClientHello may each take before the target counts as down
+CONNECT_TIMEOUT = 5
+# Later probes wait RTT_TIMEOUT_FACTOR times the slowest round trip the gate measured, within these bounds
+RTT_TIMEOUT_FACTOR = 10
+PROBE_TIMEOUT_MIN = 1.0
+PROBE_TIMEOUT_MAX = CONNECT_TIMEOUT
+
+class KeyedSlots:
+    """
+    A bounded semaphore per key. Entries are created on first use and dropped
+    once nobody holds or waits on them, so the table only ever contains the
+    keys that are currently busy.
+    """
+    def __init__(self, limit):
+        self.limit = limit
+        self.lock = threading.Lock()
+        self.entries = {}
+
+    @contextmanager
+    def hold(self, key):
+        key = (key or "").lower()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                entry = self.entries[key] = [threading.BoundedSemaphore(self.limit), 0]
+            entry[1] += 1
+        entry[0].acquire()
+        try:
+            yield
+        finally:
+            entry[0].release()
+            with self.lock:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self.entries[key]
+
+# Per-address connection slots, shared by every probe running in this process
+_host_slots = KeyedSlots(MAX_CONNECTIONS_PER_HOST)
+
+def host_slot(host):
+    return _host_slots.hold(host)
+
+# Name of the probe running on this thread, so sessions can charge connection timings to it
+_current_probe = threading.local()
+
+class ProbeRunner:
+    """
+    Runs independent probes in parallel under one overall deadline.
+    A probe submitted with a host takes a connection slot for it before it
+    starts, so one server never sees more than MAX_CONNECTIONS_PER_HOST
+    connections at once. Probes working through a ScanSession are submitted
+    with host None: the session takes a slot for each connection it opens.
+    """
+    def __init__(self, deadline=SCAN_DEADLINE):
+        self.deadline = time.monotonic() + deadline
+        self.lock = threading.Lock()
+        self.done = threading.Condition(self.lock)
+        self.results = {}
+        self.elapsed = {}
+
+    def submit(self, key, host, fn, *args):
+        # Worker threads are daemons: a probe stuck past the deadline must not keep the process alive
+        thread = threading.Thread(target=self._run, args=(key, host, fn, args), daemon=True)
+        with self.lock:
+            self.results[key] = None
+        thread.start()
+
+    def _run(self, key, host, fn, args):
+        outcome = None
+        try:
+            with host_slot(host) if host else nullcontext():
+                if time.monotonic() >= self.deadline:
+                    return
+                _current_probe.name = key[1]
+                started = time.monotonic()
+                try:
+                    outcome = ("ok", fn(*args))
+                finally:
+                    with self.lock:
+                        self.elapsed[key] = time.monotonic() - started
+        except Exception as e:
+            outcome = ("error", e)
+        with self.lock:
+            self.results[key] = outcome
+            self.done.notify_all()
+
+    def remaining(self):
+        return max(0.0, self.deadline - time.monotonic())
+
+    def wait(self, keys=None):
+        # Block until the given probes (default: all submitted) finish or the deadline passes
+        with self.lock:
+            while True:
+                pending = [k for k in (keys if keys is not None else self.results) if self.results.get(k) is None]
+                left = self.remaining()
+                if not pending or left <= 0:
+                    return
+                self.done.wait(left)
+
+    def finished(self, key):
+        with self.lock:
+            return self.results.get(key) is not None
+
+    def durations(self, tag):
+        # Run time of each finished probe submitted under this tag, by probe name
+        with self.lock:
+            return {name: seconds for (key_tag, name), seconds in self.elapsed.items() if key_tag == tag}
+
+    def result(self, key, timed_out):
+        """
+        Return the probe's value, re-raise its exception, or return the
+        timed_out placeholder if it did not finish before the deadline.
+        """
+        with self.lock:
+            outcome = self.results.get(key)
+        if outcome is None:
+            return timed_out
+        if outcome[0] == "error":
+            raise outcome[1]
+        return outcome[1]
+
+def timed_out_result(name):
+    return {"status": "timed out", "info": f"{name} check did not finish within the {SCAN_DEADLINE}s scan deadline"}
+
+def _unverified_context(version_attr=None):
+    context = ssl.create_default_context()
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    if version_attr:
+        # Pin both ends so only this specific version can be negotiated
+        tls_version = getattr(ssl.TLSVersion, version_attr)
+        context.minimum_version = tls_version
+        context.maximum_version = tls_version
+    return context
+
+# Client contexts used by the probes. They are built once per process (loading the
+# CA store is not free) and shared between threads, so probes must not mutate them.
+CONTEXT_FACTORIES = {
+    "unverified": _unverified_context,
+    "TLSv1.3": lambda: _unverified_context("TLSv1_3"),
+    "TLSv1.2": lambda: _unverified_context("TLSv1_2"),
+    "TLSv1.1": lambda: _unverified_context("TLSv1_1"),
+    "TLSv1.0": lambda: _unverified_context("TLSv1"),
+}
+
+_contexts = {}
+_contexts_lock = threading.Lock()
+
+def shared_context(name):
+    # Factories that raise (e.g. a TLS version this OpenSSL cannot pin) are retried on every call,
+    # so callers see the same exception they would have seen building the context themselves
+    with _contexts_lock:
+        context = _contexts.get(name)
+        if context is None:
+            context = _contexts[name] = CONTEXT_FACTORIES[name]()
+        return context
 
 def is_ssl_or_starttls_port(port):
     # Instead of only allowing specific ports, block ports that are definitively NOT SSL/TLS
-    non_ssl_ports = {22, 21, 20, 23, 53, 161, 162, 3306, 5432, 6379, 27017, 1433, 1521, 5984, 11211, 6667, 194}
+    non_ssl_ports = {22, 20, 23, 53, 161, 162, 3306, 6379, 27017, 1433, 1521, 5984, 11211, 6667, 194}
     return port not in non_ssl_ports
 
 def is_http_port(port):
@@ -38,87 +215,419 @@ def check_http_redirect_to_https(host, port):
     except Exception as e:
         return {"status": "error", "info": f"An unexpected error occurred during HTTP redirect check: {e}"}
 
-def try_starttls_connect(host, port, protocol):
-    try:
-        sock = socket.create_connection((host, port), timeout=5)
-        if protocol == "smtp":
-            # Read banner
-            banner = sock.recv(4096).decode()
-            if not banner.startswith("220"):
-                raise Exception(f"SMTP banner not received: {banner.strip()}")
-            sock.sendall(b"EHLO example.com\r\n")
-            ehlo_response = sock.recv(4096).decode()
-            if "STARTTLS" not in ehlo_response:
-                raise Exception("STARTTLS not supported by SMTP server")
-            sock.sendall(b"STARTTLS\r\n")
-            starttls_response = sock.recv(4096).decode()
-            if not starttls_response.startswith("220"):
-                raise Exception(f"STARTTLS command failed: {starttls_response.strip()}")
-        elif protocol == "imap":
-            banner = sock.recv(4096).decode()
-            if not banner.startswith("* OK"):
-                raise Exception(f"IMAP banner not received: {banner.strip()}")
-            sock.sendall(b"A1 CAPABILITY\r\n")
-            cap_response = sock.recv(4096).decode()
-            if "STARTTLS" not in cap_response:
-                raise Exception("STARTTLS not supported by IMAP server")
-            sock.sendall(b"A2 STARTTLS\r\n")
-            starttls_response = sock.recv(4096).decode()
-            if not starttls_response.startswith("A2 OK"):
-                raise Exception(f"STARTTLS command failed: {starttls_response.strip()}")
-        elif protocol == "pop3":
-            banner = sock.recv(4096).decode()
-            if not banner.startswith("+OK"):
-                raise Exception(f"POP3 banner not received: {banner.strip()}")
-            sock.sendall(b"CAPA\r\n")
-            cap_response = sock.recv(4096).decode()
-            if "STLS" not in cap_response:
-                raise Exception("STLS not supported by POP3 server")
-            sock.sendall(b"STLS\r\n")
-            starttls_response = sock.recv(4096).decode()
-            if not starttls_response.startswith("+OK"):
-                raise Exception(f"STLS command failed: {starttls_response.strip()}")
+class StartTLSError(Exception):
+    """
+    The server refused or does not offer STARTTLS. Unlike a network error this
+    will not change on the next connection, so a session remembers it.
+    """
+
+class ReplyReader:
+    """
+    Buffered reader for STARTTLS dialogues. Replies are read up to their
+    protocol-defined end, however the server splits them into TCP segments.
+    """
+    MAX_BUFFER = 65536
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.buffer = b""
+
+    def send(self, data):
+        self.sock.sendall(data)
+
+    def _fill(self):
+        if len(self.buffer) > self.MAX_BUFFER:
+            raise StartTLSError("STARTTLS reply too long")
+        chunk = self.sock.recv(4096)
+        if not chunk:
+            raise ConnectionError("Connection closed during STARTTLS negotiation")
+        self.buffer += chunk
+
+    def line(self):
+        while b"\n" not in self.buffer:
+            self._fill()
+        line, self.buffer = self.buffer.split(b"\n", 1)
+        return line.rstrip(b"\r").decode("utf-8", errors="replace")
+
+    def code_reply(self):
+        # SMTP/FTP: "250-first" ... "250 last"; a reply without "-" is a single line
+        lines = [self.line()]
+        if lines[0][3:4] == "-":
+            end = lines[0][:3] + " "
+            while not lines[-1].startswith(end):
+                lines.append(self.line())
+        return lines
+
+    def until_line(self, prefix):
+        # IMAP tagged response / POP3 multi-line terminator
+        lines = [self.line()]
+        while not lines[-1].startswith(prefix):
+            lines.append(self.line())
+        return lines
+
+    def until_match(self, pattern):
+        # Read up to (and including) the first match of a bytes regex
+        while True:
+            match = re.search(pattern, self.buffer)
+            if match:
+                text, self.buffer = self.buffer[:match.end()], self.buffer[match.end():]
+                return text.decode("utf-8", errors="replace")
+            self._fill()
+
+    def exactly(self, size):
+        while len(self.buffer) < size:
+            self._fill()
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+def _starttls_smtp(reader, host):
+    banner = reader.code_reply()
+    if not banner[0].startswith("220"):
+        raise StartTLSError(f"SMTP banner not received: {banner[0].strip()}")
+    reader.send(b"EHLO example.com\r\n")
+    ehlo = reader.code_reply()
+    if not any(line[4:].upper().startswith("STARTTLS") for line in ehlo if line.startswith("250")):
+        raise StartTLSError("STARTTLS not supported by SMTP server")
+    reader.send(b"STARTTLS\r\n")
+    reply = reader.code_reply()
+    if not reply[0].startswith("220"):
+        raise StartTLSError(f"STARTTLS command failed: {reply[-1].strip()}")
+
+def _starttls_imap(reader, host):
+    banner = reader.line()
+    if not banner.startswith("* OK"):
+        raise StartTLSError(f"IMAP banner not received: {banner.strip()}")
+    reader.send(b"A1 CAPABILITY\r\n")
+    capabilities = reader.until_line("A1 ")
+    if not any("STARTTLS" in line.upper() for line in capabilities):
+        raise StartTLSError("STARTTLS not supported by IMAP server")
+    reader.send(b"A2 STARTTLS\r\n")
+    reply = reader.until_line("A2 ")
+    if not reply[-1].startswith("A2 OK"):
+        raise StartTLSError(f"STARTTLS command failed: {reply[-1].strip()}")
+
+def _starttls_pop3(reader, host):
+    banner = reader.line()
+    if not banner.startswith("+OK"):
+        raise StartTLSError(f"POP3 banner not received: {banner.strip()}")
+    reader.send(b"CAPA\r\n")
+    capabilities = [reader.line()]
+    if capabilities[0].startswith("+OK"):
+        capabilities += reader.until_line(".")
+    if not any(line.upper().startswith("STLS") for line in capabilities):
+        raise StartTLSError("STLS not supported by POP3 server")
+    reader.send(b"STLS\r\n")
+    reply = reader.line()
+    if not reply.startswith("+OK"):
+        raise StartTLSError(f"STLS command failed: {reply.strip()}")
+
+def _starttls_ftp(reader, host):
+    banner = reader.code_reply()
+    if not banner[0].startswith("220"):
+        raise StartTLSError(f"FTP banner not received: {banner[0].strip()}")
+    reader.send(b"AUTH TLS\r\n")
+    reply = reader.code_reply()
+    if not reply[0].startswith("234"):
+        raise StartTLSError(f"AUTH TLS command failed: {reply[-1].strip()}")
+
+# LDAPMessage { messageID 1, ExtendedRequest { requestName 1.3.6.1.4.1.1466.20037 } }
+LDAP_STARTTLS_REQUEST = bytes.fromhex("301d02010177188016") + b"1.3.6.1.4.1.1466.20037"
+
+def _ber_element(data, offset=0):
+    # (tag, contents, next offset) of the BER element at offset
+    tag, length = data[offset], data[offset + 1]
+    offset += 2
+    if length & 0x80:
+        size = length & 0x7F
+        length = int.from_bytes(data[offset:offset + size], "big")
+        offset += size
+    return tag, data[offset:offset + length], offset + length
+
+def _starttls_ldap(reader, host):
+    reader.send(LDAP_STARTTLS_REQUEST)
+    # Read exactly one LDAPMessage: tag, (long-form) length, contents
+    header = reader.exactly(2)
+    length = header[1]
+    if length & 0x80:
+        size = reader.exactly(length & 0x7F)
+        header += size
+        length = int.from_bytes(size, "big")
+    _, message, _ = _ber_element(header + reader.exactly(length))
+    _, _, offset = _ber_element(message)  # messageID
+    tag, response, _ = _ber_element(message, offset)
+    if tag != 0x78:
+        raise StartTLSError(f"Unexpected LDAP response (tag 0x{tag:02x})")
+    _, result_code, _ = _ber_element(response)
+    if int.from_bytes(result_code, "big") != 0:
+        raise StartTLSError(f"LDAP StartTLS refused (resultCode {int.from_bytes(result_code, 'big')})")
+
+def _starttls_xmpp(reader, host, namespace):
+    reader.send((
+        "<?xml version='1.0'?><stream:stream xmlns='" + namespace + "' "
+        "xmlns:stream='http://etherx.jabber.org/streams' to='" + host + "' version='1.0'>"
+    ).encode())
+    features = reader.until_match(rb"</stream:features>|<stream:features\s*/>")
+    if "urn:ietf:params:xml:ns:xmpp-tls" not in features:
+        raise StartTLSError("STARTTLS not supported by XMPP server")
+    reader.send(b"<starttls xmlns='urn:ietf:params:xml:ns:xmpp-tls'/>")
+    reply = reader.until_match(rb"<(proceed|failure)\b[^>]*>")
+    if "<proceed" not in reply:
+        raise StartTLSError("STARTTLS command failed: XMPP server answered <failure/>")
+
+def _starttls_postgres(reader, host):
+    # SSLRequest: length 8, request code 80877103; the server answers with one byte
+    reader.send(bytes.fromhex("0000000804d2162f"))
+    answer = reader.exactly(1)
+    if answer != b"S":
+        raise StartTLSError("SSL not supported by PostgreSQL server")
+
+# STARTTLS negotiators by protocol name
+STARTTLS_PROTOCOLS = {
+    "smtp": _starttls_smtp,
+    "imap": _starttls_imap,
+    "pop3": _starttls_pop3,
+    "ftp": _starttls_ftp,
+    "ldap": _starttls_ldap,
+    "xmpp": lambda reader, host: _starttls_xmpp(reader, host, "jabber:client"),
+    "xmpp-server": lambda reader, host: _starttls_xmpp(reader, host, "jabber:server"),
+    "postgres": _starttls_postgres,
+}
+
+# Common STARTTLS ports and their associated protocols
+STARTTLS_PORTS = {
+    21: "ftp",
+    25: "smtp",
+    110: "pop3",
+    143: "imap",
+    389: "ldap",
+    587: "smtp",
+    5222: "xmpp",
+    5269: "xmpp-server",
+    5432: "postgres",
+}
+
+def starttls_negotiate(sock, protocol, host):
+    # Take a freshly connected plain socket through the protocol's STARTTLS upgrade
+    negotiate = STARTTLS_PROTOCOLS.get(protocol)
+    if negotiate is None:
+        raise Exception(f"Unsupported STARTTLS protocol: {protocol}")
+    reader = ReplyReader(sock)
+    negotiate(reader, host)
+    if reader.buffer:
+        # Anything sent before our ClientHello would be read as part of the TLS stream
+        raise StartTLSError("Unexpected data after STARTTLS reply")
+
+def record_handshake(ssock):
+    # Everything a check could want to know about a completed handshake
+    session = getattr(ssock, 'session', None)
+    return {
+        "version": ssock.version(),
+        "cipher": ssock.cipher(),
+        "compression": ssock.compression(),
+        # Only a ticket counts: every session exists, including plain session-ID resumption
+        "session_ticket": bool(session and session.has_ticket),
+        "peercert": ssock.getpeercert(),
+        "der": ssock.getpeercert(binary_form=True),
+    }
+
+def resolve_addresses(host, port):
+    """
+    Resolve host once for the whole scan: every A/AAAA address, duplicates
+    dropped, in getaddrinfo's order
+    """
+    addresses = []
+    for _, _, _, _, sockaddr in socket.getaddrinfo(host, port, type=socket.SOCK_STREAM):
+        if sockaddr[0] not in addresses:
+            addresses.append(sockaddr[0])
+    return addresses
+
+class ScanSession:
+    """
+    Per-scan handshake observation layer. Each distinct client configuration
+    (a CONTEXT_FACTORIES name) is handshaken at most once per target, and the
+    cipher suite enumeration runs at most once; every check reads the recorded
+    outcome instead of opening its own connections. Safe to share between
+    probe threads.
+
+    check_reachable() is the fail-fast gate run before any probe; it also sets
+    the timeout every later connection uses. Connect, STARTTLS and handshake
+    time is accumulated per probe in timings.
+    """
+    def __init__(self, host, port, address=None, starttls=None, deadline=None):
+        self.host = host
+        self.port = port
+        # Connections go to this IP; the host name is still what SNI and HTTP Host carry
+        self.address = address or host
+        self.starttls = starttls or STARTTLS_PORTS.get(port)
+        # time.monotonic() value after which the probes' results are no longer waited for
+        self.deadline = deadline
+        self.starttls_error = None
+        self.lock = threading.Lock()
+        self.records = {}
+        self.handshakes = 0
+        self.connections = 0
+        self.timeout = CONNECT_TIMEOUT
+        self.timings = {}
+
+    def _once(self, key, fn):
+        """
+        Return fn()'s result for this key, or raise the exception it failed
+        with. fn runs once; concurrent callers wait for the first one.
+        """
+        with self.lock:
+            entry = self.records.get(key)
+            owner = entry is None
+            if owner:
+                entry = self.records[key] = {"ready": threading.Event()}
+        if owner:
+            try:
+                entry["record"] = fn()
+            except Exception as e:
+                entry["error"] = e
+            finally:
+                entry["ready"].set()
         else:
-            raise Exception(f"Unsupported STARTTLS protocol: {protocol}")
+            entry["ready"].wait()
+        if "error" in entry:
+            raise entry["error"]
+        return entry["record"]
 
-        context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
-        context.check_hostname = False
-        context.verify_mode = ssl.CERT_NONE
-        ssock = context.wrap_socket(sock, server_hostname=host)
-        return ssock
-    except Exception as e:
-        
-        raise
+    def record_timing(self, phase, seconds, label=None):
+        # Charged to the probe running on this thread unless a label says otherwise
+        label = label or getattr(_current_probe, "name", None) or "session"
+        with self.lock:
+            phases = self.timings.setdefault(label, {})
+            phases[phase] = phases.get(phase, 0.0) + seconds
+
+    def check_reachable(self):
+        """
+        Connect (through STARTTLS where needed) and send one ClientHello. Raises
+        if the connection fails, the STARTTLS upgrade is refused (StartTLSError)
+        or nothing answers within CONNECT_TIMEOUT, so the caller can skip every
+        probe; any answer, even an alert or a close, shows something is
+        listening. Returns the probe timeout derived from the round trips
+        measured on the way.
+        """
+        started = time.monotonic()
+        with self.connection(CONNECT_TIMEOUT) as sock:
+            connected = time.monotonic()
+            sock.sendall(tls_hello.build_client_hello(tls_hello.TLS12, list(tls_hello.CIPHER_SUITES), self.host))
+            try:
+                sock.recv(1)
+            except socket.timeout:
+                raise TimeoutError(f"No response to ClientHello within {CONNECT_TIMEOUT}s") from None
+            except OSError:
+                pass
+            answered = time.monotonic()
+        self.record_timing("handshake", answered - connected)
+        slowest = max(connected - started, answered - connected)
+        self.timeout = min(PROBE_TIMEOUT_MAX, max(PROBE_TIMEOUT_MIN, RTT_TIMEOUT_FACTOR * slowest))
+        return self.timeout
+
+    def handshake(self, config="unverified"):
+        return self._once(config, lambda: self._perform(config))
+
+    def cipher_suites(self):
+        """
+        Every suite the server accepts per protocol version, as a
+        tls_hello.SuiteEnumeration. Uses hand-built ClientHellos, so it covers
+        SSLv2/SSLv3 and export suites whatever the local OpenSSL supports.
+        """
+        return self._once("cipher_suites", self._enumerate)
+
+    def _enumerate(self):
+        # The enumeration runs its own threads, so its connections are labelled explicitly.
+        # It stops starting rounds one timeout before the deadline, so the round in flight
+        # still lands in time and the checks can report from the partial result.
+        started = time.monotonic()
+        stop = self.deadline - self.timeout if self.deadline else None
+        try:
+            return tls_hello.enumerate_suites(partial(self.exchange, label="cipher_suites"), self.host, stop=stop)
+        finally:
+            self.record_timing("total", time.monotonic() - started, "cipher_suites")
 
-def check_heartbleed(host, port):
+    @contextmanager
+    def connection(self, timeout=None, label=None):
+        """
+        A plain connection to the target, taken through the STARTTLS upgrade
+        where the port needs one, ready for a ClientHello. The address's
+        connection slot is held until the block exits and the socket is closed.
+        """
+        with host_slot(self.address):
+            sock = self._connect(timeout, label)
+            try:
+                yield sock
+            finally:
+                sock.close()
+
+    @contextmanager
+    def exchange(self, label=None):
+        """
+        connection() for probes that write and read the handshake records
+        themselves: the time from getting the socket to closing it is charged
+        to the probe's "handshake" phase.
+        """
+        with self.connection(label=label) as sock:
+            started = time.monotonic()
+            try:
+                yield sock
+            finally:
+                self.record_timing("handshake", time.monotonic() - started, label)
+
+    def _connect(self, timeout, label):
+        if self.starttls_error:
+            # The server already said no; every other probe would get the same answer
+            raise self.starttls_error
+        with self.lock:
+            self.connections += 1
+        started = time.monotonic()
+        try:
+            sock = socket.create_connection((self.address, self.port), timeout=timeout or self.timeout)
+        finally:
+            self.record_timing("connect", time.monotonic() - started, label)
+        if self.starttls:
+            started = time.monotonic()
+            try:
+                starttls_negotiate(sock, self.starttls, self.host)
+            except StartTLSError as e:
+                sock.close()
+                self.starttls_error = e
+                raise
+            except Exception:
+                sock.close()
+                raise
+            finally:
+                self.record_timing("starttls", time.monotonic() - started, label)
+        return sock
+
+    def _perform(self, config):
+        context = shared_context(config)
+        with self.lock:
+            self.handshakes += 1
+        with self.connection() as sock:
+            started = time.monotonic()
+            try:
+                ssock = context.wrap_socket(sock, server_hostname=self.host)
+            finally:
+                self.record_timing("handshake", time.monotonic() - started)
+            with ssock:
+                return record_handshake(ssock)
+
+def check_heartbleed(host, port, session=None):
 
     # Real Heartbleed test (sends malicious heartbeat and checks for extra data)
     # No OpenSSL dependency
-    hello = bytes.fromhex(
-        "16 03 02 00 dc 01 00 00 d8 03 02 53 43 5b 90 4b 90 6b 7b"
-        "c5 8c 8b 0b 3a 8d 2f 0a 21 9b 8e 09 0e 26 6b 0e 49 00 00"
-        "66 c0 14 c0 0a 00 39 00 38 00 88 00 87 c0 0f c0 05 00 35"
-        "00 84 c0 12 c0 08 00 16 00 13 c0 13 c0 09 00 33 00 32 00"
-        "9a 00 99 00 45 00 44 c0 0e c0 04 00 2f 00 96 00 41 c0 11"
-        "c0 07 c0 0c c0 02 00 05 00 04 00 15 00 12 00 09 00 14 00"
-        "11 00 08 00 06 00 03 00 ff 01 00 00 49 00 0b 00 04 03 00"
-        "01 02 00 0a 00 34 00 32 00 0e 00 0d 00 19 00 0b 00 0c 00"
-        "18 00 09 00 0a 00 16 00 17 00 08 00 06 00 07 00 14 00 15"
-        "00 04 00 05 00 12 00 13 00 01 00 02 00 03 00 0f 00 10 00"
-        "11 00 23 00 00 00 0f 00 01 01"
-    )
+    session = session or ScanSession(host, port)
+    hello = tls_hello.build_client_hello(tls_hello.TLS11, list(tls_hello.CIPHER_SUITES), host, heartbeat=True)
     heartbeat = bytes.fromhex(
         "18 03 02 00 03 01 40 00"
     )
     try:
-        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        s.settimeout(5)
-        s.connect((host, port))
-        s.sendall(hello)
-        s.recv(4096)
-        s.sendall(heartbeat)
-        data = s.recv(4096)
-        s.close()
+        with session.exchange() as s:
+            s.sendall(hello)
+            s.recv(4096)
+            s.sendall(heartbeat)
+            data = s.recv(4096)
         if len(data) > 7:
             return {"status": "vulnerable", "info": "Heartbleed vulnerability detected!"}
         else:
@@ -128,84 +637,112 @@ def check_heartbleed(host, port):
     except Exception as e:
         return {"status": "not vulnerable", "info": f"Error or not supported: {e}"}
 
-def check_sweet32(host, port):
-    # SWEET32: vulnerable if 3DES cipher is supported
-    try:
-        context = ssl.create_default_context()
-        context.set_ciphers('3DES')
-        with socket.create_connection((host, port), timeout=5) as sock:
-            with context.wrap_socket(sock, server_hostname=host) as ssock:
-                cipher = ssock.cipher()
-                if cipher and '3DES' in cipher[0]:
-                    return {"status": "potentially vulnerable", "info": f"3DES supported: {cipher[0]}"}
-                else:
-                    return {"status": "not vulnerable", "info": "3DES not supported"}
-    except ssl.SSLError:
-        return {"status": "not vulnerable", "info": "3DES not supported (handshake failed)"}
-    except Exception as e:
-        return {"status": "not tested", "info": f"Error: {e}"}
+def unfinished_result(name, suites, versions=None):
+    """
+    "timed out" result for a check whose negative answer would rest on
+    versions the enumeration did not finish, or None if it did finish them
+    """
+    unfinished = suites.unfinished_versions(versions)
+    if unfinished:
+        return {"status": "timed out", "info": f"{name} check incomplete: cipher suite enumeration of {', '.join(unfinished)} did not finish within the {SCAN_DEADLINE}s scan deadline"}
+    return None
 
-def check_poodle(host, port):
-    try:
-        import ssl, socket
-        try:
-            context = ssl.SSLContext(ssl.PROTOCOL_SSLv3)
-        except AttributeError:
-            return {"status": "not vulnerable", "info": "SSLv3 not supported by OpenSSL/Python"}
-        try:
-            with socket.create_connection((host, port), timeout=5) as sock:
-                with context.wrap_socket(sock, server_hostname=host) as ssock:
-                    return {"status": "vulnerable", "info": "SSLv3 supported (POODLE)"}
-        except Exception as e:
-            if "WRONG_VERSION_NUMBER" in str(e) or "unsupported protocol" in str(e):
-                return {"status": "not vulnerable", "info": "SSLv3 not supported by server"}
-            return {"status": "not vulnerable", "info": f"SSLv3 not supported ({e})"}
-    except Exception as e:
-        if "SSLv3_METHOD" in str(e):
-            return {"status": "not vulnerable", "info": "SSLv3 not supported by OpenSSL/Python"}
-        return {"status": "not tested", "info": f"Error: {e}"}
-
-def check_beast(host, port):
-    import ssl, socket
-    cbc_ciphers = [
-        'AES128-SHA', 'AES256-SHA', 'DES-CBC3-SHA', 'AES128-SHA256', 'AES256-SHA256'
-    ]
-    try:
-        context = ssl.SSLContext(ssl.PROTOCOL_TLSv1)
-        context.set_ciphers(':'.join(cbc_ciphers))
-        with socket.create_connection((host, port), timeout=5) as sock:
-            with context.wrap_socket(sock, server_hostname=host) as ssock:
-                cipher = ssock.cipher()
-                if cipher and 'CBC' in cipher[0].upper():
-                    return {"status": "vulnerable", "info": f"CBC cipher accepted: {cipher[0]}"}
-                else:
-                    return {"status": "not vulnerable", "info": f"No CBC cipher accepted: {cipher}"}
-    except Exception as e:
-        return {"status": "not vulnerable", "info": f"TLS 1.0 or CBC ciphers not supported ({e})"}
+def check_sweet32(host, port, session=None):
+    # SWEET32: vulnerable if any 64-bit block cipher (3DES, DES, IDEA, RC2) is accepted
+    session = session or ScanSession(host, port)
+    suites = session.cipher_suites()
+    for version, suite in suites.all_accepted():
+        if re.search(r"DES|IDEA|RC2", suite):
+            return {"status": "potentially vulnerable", "info": f"64-bit block cipher supported: {suite} ({version})"}
+    incomplete = unfinished_result("SWEET32", suites)
+    if incomplete:
+        return incomplete
+    if suites.failure():
+        return {"status": "not tested", "info": f"Error: {suites.failure()}"}
+    return {"status": "not vulnerable", "info": "No 64-bit block cipher supported"}
 
-def check_crime(host, port):
-    import ssl, socket
+def check_poodle(host, port, session=None):
+    session = session or ScanSession(host, port)
+    suites = session.cipher_suites()
+    if suites.accepted("SSLv3"):
+        return {"status": "vulnerable", "info": "SSLv3 supported (POODLE)"}
+    incomplete = unfinished_result("POODLE", suites, ["SSLv3"])
+    if incomplete:
+        return incomplete
+    if suites.error("SSLv3"):
+        return {"status": "not vulnerable", "info": f"SSLv3 not supported ({suites.error('SSLv3')})"}
+    return {"status": "not vulnerable", "info": "SSLv3 not supported by server"}
+
+def check_beast(host, port, session=None):
+    session = session or ScanSession(host, port)
+    suites = session.cipher_suites()
+    for version in ("TLSv1.0", "SSLv3"):
+        cbc = [suite for suite in suites.accepted(version) if "CBC" in suite]
+        if cbc:
+            return {"status": "vulnerable", "info": f"CBC cipher accepted: {cbc[0]} ({version})"}
+    incomplete = unfinished_result("BEAST", suites, ["TLSv1.0", "SSLv3"])
+    if incomplete:
+        return incomplete
+    if suites.error("TLSv1.0"):
+        return {"status": "not vulnerable", "info": f"TLS 1.0 or CBC ciphers not supported ({suites.error('TLSv1.0')})"}
+    return {"status": "not vulnerable", "info": "No CBC cipher accepted over TLS 1.0 or SSLv3"}
+
+def check_crime(host, port, session=None):
+    session = session or ScanSession(host, port)
     try:
-        context = ssl.create_default_context()
-        with socket.create_connection((host, port), timeout=5) as sock:
-            with context.wrap_socket(sock, server_hostname=host) as ssock:
-                if ssock.compression():
-                    return {"status": "vulnerable", "info": f"TLS compression enabled: {ssock.compression()}"}
-                else:
-                    return {"status": "not vulnerable", "info": "TLS compression not enabled"}
+        compression = session.handshake()["compression"]
+        if compression:
+            return {"status": "vulnerable", "info": f"TLS compression enabled: {compression}"}
+        else:
+            return {"status": "not vulnerable", "info": "TLS compression not enabled"}
     except Exception as e:
         if "WRONG_VERSION_NUMBER" in str(e):
             return {"status": "not_applicable", "info": f"Protocol mismatch: {e}"}
         return {"status": "error", "info": f"Error: {e}"}
 
-def check_breach(host, port):
+def https_get(session, path):
+    """
+    Minimal HTTPS GET over the session's pinned connection.
+    Returns the status code and the response headers (lowercased names).
+    """
+    authority = f"[{session.host}]" if ":" in session.host else session.host
+    if session.port != 443:
+        authority += f":{session.port}"
+    request = f"GET {path} HTTP/1.1\r\nHost: {authority}\r\nAccept-Encoding: gzip, deflate\r\nConnection: close\r\n\r\n"
+    with session.connection() as sock, shared_context("unverified").wrap_socket(sock, server_hostname=session.host) as ssock:
+        ssock.sendall(request.encode())
+        head = b""
+        while b"\r\n\r\n" not in head and len(head) < 65536:
+            chunk = ssock.recv(4096)
+            if not chunk:
+                break
+            head += chunk
+    lines = head.split(b"\r\n\r\n", 1)[0].decode("iso-8859-1").split("\r\n")
+    if not lines[0].startswith("HTTP/"):
+        raise ValueError(f"No HTTP response: {lines[0][:100]!r}")
+    status = int(lines[0].split()[1])
+    headers = {}
+    for line in lines[1:]:
+        name, _, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip()
+    return status, headers
+
+def check_breach(host, port, session=None):
     if not is_http_port(port):
         return {"status": "not_applicable", "info": "BREACH check is only applicable to HTTP/HTTPS ports."}
+    session = session or ScanSession(host, port)
     try:
-        import requests
-        url = f"https://{host}:{port}/"
-        r = requests.get(url, timeout=5)
-        encoding = r.headers.get('Content-Encoding', '')
+        path = "/"
+        # Follow redirects that stay on this endpoint, e.g. / -> /en/
+        for _ in range(5):
+            status, headers = https_get(session, path)
+            location = urljoin(f"https://{host}:{port}{path}", headers.get("location", ""))
+            target = urlparse(location)
+            if status not in (301, 302, 303, 307, 308) or target.scheme != "https" \
+                    or (target.hostname or "").lower() != host.lower() or (target.port or 443) != port:
+                break
+            path = (target.path or "/") + (f"?{target.query}" if target.query else "")
+        encoding = headers.get('content-encoding', '')
         if 'gzip' in encoding or 'deflate' in encoding:
             return {"status": "vulnerable", "info": f"HTTP compression enabled: {encoding}"}
         else:
@@ -213,107 +750,117 @@ def check_breach(host, port):
     except Exception as e:
         return {"status": "error", "info": f"Error: {e}"}
 
-def check_freak(host, port):
-    import ssl, socket
-    try:
-        context = ssl.create_default_context()
-        try:
-            context.set_ciphers('EXP-RC4-MD5:EXP-RC2-CBC-MD5:EXP-DES-CBC-SHA:EXP-RSA-DES-CBC-SHA')
-        except ssl.SSLError as e:
-            if "No cipher can be selected" in str(e):
-                return {"status": "not vulnerable", "info": "Export ciphers not supported by OpenSSL/Python"}
-            raise
-        with socket.create_connection((host, port), timeout=5) as sock:
-            with context.wrap_socket(sock, server_hostname=host) as ssock:
-                cipher = ssock.cipher()
-                if cipher and 'EXP' in cipher[0]:
-                    return {"status": "vulnerable", "info": f"Export cipher accepted: {cipher[0]}"}
-                else:
-                    return {"status": "not vulnerable", "info": f"No export cipher accepted: {cipher}"}
-    except Exception as e:
-        if "No cipher can be selected" in str(e):
-            return {"status": "not vulnerable", "info": "Export ciphers not supported by OpenSSL/Python"}
-        return {"status": "not vulnerable", "info": f"Export ciphers not supported ({e})"}
+def check_freak(host, port, session=None):
+    session = session or ScanSession(host, port)
+    suites = session.cipher_suites()
+    for version, suite in suites.all_accepted():
+        # RSA key exchange only: DH(E)_RSA_EXPORT suites are LOGJAM's, not FREAK's
+        if suite.startswith("TLS_RSA_EXPORT"):
+            return {"status": "vulnerable", "info": f"Export cipher accepted: {suite} ({version})"}
+    incomplete = unfinished_result("FREAK", suites)
+    if incomplete:
+        return incomplete
+    if suites.failure():
+        return {"status": "not vulnerable", "info": f"Export ciphers not supported ({suites.failure()})"}
+    return {"status": "not vulnerable", "info": "No export cipher accepted"}
 
-def check_logjam(host, port):
-    import ssl, socket
-    try:
-        context = ssl.create_default_context()
-        try:
-            context.set_ciphers('EXP-EDH-RSA-DES-CBC-SHA:EXP-EDH-DSS-DES-CBC-SHA')
-        except ssl.SSLError as e:
-            if "No cipher can be selected" in str(e):
-                return {"status": "not vulnerable", "info": "Export DH ciphers not supported by OpenSSL/Python"}
-            raise
-        with socket.create_connection((host, port), timeout=5) as sock:
-            with context.wrap_socket(sock, server_hostname=host) as ssock:
-                cipher = ssock.cipher()
-                if cipher and 'EXP' in cipher[0]:
-                    return {"status": "vulnerable", "info": f"Export DH cipher accepted: {cipher[0]}"}
-                else:
-                    return {"status": "not vulnerable", "info": f"No export DH cipher accepted: {cipher}"}
-    except Exception as e:
-        if "No cipher can be selected" in str(e):
-            return {"status": "not vulnerable", "info": "Export DH ciphers not supported by OpenSSL/Python"}
-        return {"status": "not vulnerable", "info": f"Export DH ciphers not supported ({e})"}
+def check_logjam(host, port, session=None):
+    session = session or ScanSession(host, port)
+    suites = session.cipher_suites()
+    for version, suite in suites.all_accepted():
+        # DHE_RSA_EXPORT, DHE_DSS_EXPORT1024, DH_anon_EXPORT, ...
+        if re.search(r"_DHE?_\w*EXPORT", suite):
+            return {"status": "vulnerable", "info": f"Export DH cipher accepted: {suite} ({version})"}
+    incomplete = unfinished_result("LOGJAM", suites)
+    if incomplete:
+        return incomplete
+    if suites.failure():
+        return {"status": "not vulnerable", "info": f"Export DH ciphers not supported ({suites.failure()})"}
+    return {"status": "not vulnerable", "info": "No export DH cipher accepted"}
 
-def check_drown(host, port):
-    try:
-        from OpenSSL import SSL
-        import socket
-        if not hasattr(SSL, 'SSLv2_METHOD'):
-            return {"status": "not vulnerable", "info": "SSLv2 not supported by OpenSSL/Python"}
-        ctx = SSL.Context(SSL.SSLv2_METHOD)
-        sock = socket.socket()
-        sock.settimeout(5)
-        sock.connect((host, port))
-        ssl_sock = SSL.Connection(ctx, sock)
-        ssl_sock.set_connect_state()
-        ssl_sock.do_handshake()
-        ssl_sock.close()
-        sock.close()
+def check_drown(host, port, session=None):
+    session = session or ScanSession(host, port)
+    suites = session.cipher_suites()
+    if suites.accepted("SSLv2"):
         return {"status": "vulnerable", "info": "SSLv2 supported (DROWN)"}
-    except Exception as e:
-        if "SSLv2_METHOD" in str(e):
-            return {"status": "not vulnerable", "info": "SSLv2 not supported by OpenSSL/Python"}
-        return {"status": "not vulnerable", "info": f"SSLv2 not supported ({e})"}
+    incomplete = unfinished_result("DROWN", suites, ["SSLv2"])
+    if incomplete:
+        return incomplete
+    if suites.error("SSLv2"):
+        return {"status": "not vulnerable", "info": f"SSLv2 not supported ({suites.error('SSLv2')})"}
+    return {"status": "not vulnerable", "info": "SSLv2 not supported by server"}
 
-def check_robot(host, port):
-    import ssl, socket
-    try:
-        context = ssl.create_default_context()
-        with socket.create_connection((host, port), timeout=5) as sock:
-            with context.wrap_socket(sock, server_hostname=host) as ssock:
-                cipher = ssock.cipher()
-                if cipher and 'RSA' in cipher[0]:
-                    return {"status": "potentially vulnerable", "info": f"RSA key exchange supported: {cipher[0]}"}
-                else:
-                    return {"status": "not vulnerable", "info": f"No RSA key exchange: {cipher}"}
-    except Exception as e:
-        if "WRONG_VERSION_NUMBER" in str(e):
-            return {"status": "not_applicable", "info": f"Protocol mismatch: {e}"}
-        return {"status": "error", "info": f"Error: {e}"}
+def check_robot(host, port, session=None):
+    session = session or ScanSession(host, port)
+    suites = session.cipher_suites()
+    for version, suite in suites.all_accepted():
+        # Static RSA key exchange only (export grades included); ECDHE_RSA merely signs with RSA.
+        # Every SSLv2 cipher spec uses RSA key exchange.
+        if re.match(r"TLS_RSA_(WITH|EXPORT)", suite) or version == "SSLv2":
+            return {"status": "potentially vulnerable", "info": f"RSA key exchange supported: {suite} ({version})"}
+    incomplete = unfinished_result("ROBOT", suites)
+    if incomplete:
+        return incomplete
+    if suites.failure():
+        return {"status": "error", "info": f"Error: {suites.failure()}"}
+    return {"status": "not vulnerable", "info": "No RSA key exchange"}
 
-def check_ticketbleed(host, port):
-    import ssl, socket
+def check_ticketbleed(host, port, session=None):
+    session = session or ScanSession(host, port)
     try:
-        context = ssl.create_default_context()
-        context.options &= ~ssl.OP_NO_TICKET  # Enable session tickets
-        with socket.create_connection((host, port), timeout=5) as sock:
-            with context.wrap_socket(sock, server_hostname=host) as ssock:
-                if hasattr(ssock, 'session') and ssock.session:
-                    return {"status": "potentially vulnerable", "info": "Session tickets supported (cannot test leakage in stdlib)"}
-                else:
-                    return {"status": "not vulnerable", "info": "Session tickets not supported"}
+        # Ticketbleed is a TLS 1.2 session-ID/ticket bug, and a TLS 1.3 ticket only arrives after
+        # the handshake, so ask over TLS 1.2; a server without it falls back to the default handshake
+        try:
+            handshake = session.handshake("TLSv1.2")
+        except Exception:
+            handshake = session.handshake()
+        if handshake["session_ticket"]:
+            return {"status": "potentially vulnerable", "info": "Session tickets supported (cannot test leakage in stdlib)"}
+        else:
+            return {"status": "not vulnerable", "info": "Session tickets not supported"}
     except Exception as e:
         if "WRONG_VERSION_NUMBER" in str(e):
             return {"status": "not_applicable", "info": f"Protocol mismatch: {e}"}
         return {"status": "error", "info": f"Error: {e}"}
 
-def detect_protocols_and_ciphers(host, port):
+# ssl.SSLSocket.version() names mapped to the names used in protocol_support
+NEGOTIATED_VERSIONS = {
+    "TLSv1.3": "TLSv1.3",
+    "TLSv1.2": "TLSv1.2",
+    "TLSv1.1": "TLSv1.1",
+    "TLSv1": "TLSv1.0",
+}
+
+def detect_protocols_and_ciphers(host, port, session=None):
     if not is_ssl_or_starttls_port(port):
         return [], 0, {"status": "not_applicable", "info": "Port is not a standard SSL/TLS or STARTTLS port."}
 
+    session = session or ScanSession(host, port)
+    protocols = []
+    cipher_strengths = []
+    status = {"status": "success", "info": "Protocol detection completed."}
+
+    suites = session.cipher_suites()
+    for name in tls_hello.VERSIONS:
+        accepted = suites.accepted(name)
+        if accepted:
+            protocols.append(name)
+            # Strongest accepted suite: acceptance order says nothing about a server that follows the client's order
+            cipher_strengths.append(max(tls_hello.cipher_bits(suite) for suite in accepted))
+
+    unfinished = suites.unfinished_versions()
+    if unfinished:
+        # What was accepted is real; versions that were cut short may be missing from the list
+        status = {"status": "timed out", "info": f"Cipher suite enumeration of {', '.join(unfinished)} did not finish within the {SCAN_DEADLINE}s scan deadline"}
+    if protocols:
+        status["cipher_suites"] = suites.as_dict()
+    elif not suites.failure() and not unfinished:
+        # The server answered but took nothing from our suite table; fall back to what the local OpenSSL can negotiate
+        protocols, cipher_strengths = handshake_protocols(session)
+
+    return protocols, max(cipher_strengths) if cipher_strengths else 0, status
+
+def handshake_protocols(session):
     protocols = []
     cipher_strengths = []
     
@@ -324,147 +871,60 @@ def detect_protocols_and_ciphers(host, port):
         ("TLSv1.1", "TLSv1_1"),
         ("TLSv1.0", "TLSv1"),
     ]
-    
-    # Common STARTTLS ports and their associated protocols
-    starttls_ports = {
-        25: "smtp",
-        143: "imap",
-        110: "pop3",
-        587: "smtp",
-    }
+
+    # The baseline handshake already tells us about the version the server prefers,
+    # so that version does not need a pinned handshake of its own
+    try:
+        baseline = session.handshake()
+    except Exception:
+        baseline = None
 
     for name, version_attr in protocol_tests:
-        ssock = None
         try:
-            # Use create_default_context and configure it properly
-            context = ssl.create_default_context()
-            context.check_hostname = False
-            context.verify_mode = ssl.CERT_NONE
-            
-            # Set minimum and maximum version to test only this specific version
-            if hasattr(ssl, 'TLSVersion') and hasattr(ssl.TLSVersion, version_attr):
-                tls_version = getattr(ssl.TLSVersion, version_attr)
-                context.minimum_version = tls_version
-                context.maximum_version = tls_version
+            if baseline and NEGOTIATED_VERSIONS.get(baseline["version"]) == name:
+                record = baseline
+            elif hasattr(ssl, 'TLSVersion') and hasattr(ssl.TLSVersion, version_attr):
+                # Handshake with a context that can only negotiate this specific version
+                record = session.handshake(name)
             else:
                 # Fallback for older Python versions - skip deprecated protocols
                 if name in ["TLSv1.0", "TLSv1.1"]:
                     continue
                 # For TLS 1.2 and 1.3, use default context (will negotiate best available)
-                pass
-            
-            if port in starttls_ports:
-                # Use the existing STARTTLS function but with our specific context
-                try:
-                    sock = socket.create_connection((host, port), timeout=5)
-                    protocol = starttls_ports[port]
-                    
-                    if protocol == "smtp":
-                        # SMTP STARTTLS
-                        banner = sock.recv(4096).decode()
-                        if not banner.startswith("220"):
-                            raise Exception(f"SMTP banner not received: {banner.strip()}")
-                        sock.sendall(b"EHLO example.com\r\n")
-                        ehlo_response = sock.recv(4096).decode()
-                        if "STARTTLS" not in ehlo_response:
-                            raise Exception("STARTTLS not supported by SMTP server")
-                        sock.sendall(b"STARTTLS\r\n")
-                        starttls_response = sock.recv(4096).decode()
-                        if not starttls_response.startswith("220"):
-                            raise Exception(f"STARTTLS command failed: {starttls_response.strip()}")
-                    elif protocol == "imap":
-                        # IMAP STARTTLS
-                        banner = sock.recv(4096).decode()
-                        if not banner.startswith("* OK"):
-                            raise Exception(f"IMAP banner not received: {banner.strip()}")
-                        sock.sendall(b"A1 CAPABILITY\r\n")
-                        cap_response = sock.recv(4096).decode()
-                        if "STARTTLS" not in cap_response:
-                            raise Exception("STARTTLS not supported by IMAP server")
-                        sock.sendall(b"A2 STARTTLS\r\n")
-                        starttls_response = sock.recv(4096).decode()
-                        if not starttls_response.startswith("A2 OK"):
-                            raise Exception(f"STARTTLS command failed: {starttls_response.strip()}")
-                    elif protocol == "pop3":
-                        # POP3 STARTTLS
-                        banner = sock.recv(4096).decode()
-                        if not banner.startswith("+OK"):
-                            raise Exception(f"POP3 banner not received: {banner.strip()}")
-                        sock.sendall(b"CAPA\r\n")
-                        cap_response = sock.recv(4096).decode()
-                        if "STLS" not in cap_response:
-                            raise Exception("STLS not supported by POP3 server")
-                        sock.sendall(b"STLS\r\n")
-                        starttls_response = sock.recv(4096).decode()
-                        if not starttls_response.startswith("+OK"):
-                            raise Exception(f"STLS command failed: {starttls_response.strip()}")
-                    
-                    # Now upgrade to SSL/TLS with our specific context
-                    ssock = context.wrap_socket(sock, server_hostname=host)
-                except Exception:
-                    if ssock:
-                        ssock.close()
+                if baseline is None:
                     continue
-            else:
-                # Direct SSL/TLS connection
-                sock = socket.create_connection((host, port), timeout=5)
-                ssock = context.wrap_socket(sock, server_hostname=host)
-
-            if ssock:
-                # Successfully connected with this protocol version
-                protocols.append(name)
-                cipher = ssock.cipher()
-                if cipher:
-                    cipher_strengths.append(cipher[2])
-                ssock.close()
+                record = baseline
         except Exception:
             # If connection fails, this protocol version is not supported
-            if ssock:
-                ssock.close()
             continue
+
+        # Successfully connected with this protocol version
+        protocols.append(name)
+        if record["cipher"]:
+            cipher_strengths.append(record["cipher"][2])
     
-    return protocols, max(cipher_strengths) if cipher_strengths else 0, {"status": "success", "info": "Protocol detection completed."}
+    return protocols, cipher_strengths
 
-def get_cert_info(host, port):
+def get_cert_info(host, port, session=None):
     try:
-        context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
-        context.check_hostname = False
-        context.verify_mode = ssl.CERT_NONE
-        ssock = None
-        
-        # Common STARTTLS ports
-        starttls_ports = {
-            25: "smtp",
-            143: "imap",
-            110: "pop3",
-            587: "smtp",
-        }
+        record = None
+        session = session or ScanSession(host, port)
 
         if not is_ssl_or_starttls_port(port):
             return {"status": "not_applicable", "info": "Port is not a standard SSL/TLS or STARTTLS port."}
 
-        if port in starttls_ports:
-            try:
-                ssock = try_starttls_connect(host, port, starttls_ports[port])
-            except Exception as e:
-                
+        # The certificate comes from the shared baseline handshake
+        try:
+            record = session.handshake()
+        except Exception as e:
+            if session.starttls:
                 return {"error": f"STARTTLS connection failed: {e}", "valid": False}
-        else:
-            # Direct SSL/TLS connection
-            try:
-                sock = socket.create_connection((host, port), timeout=5)
-                context = ssl.create_default_context(ssl.Purpose.SERVER_AUTH)
-                context.check_hostname = False
-                context.verify_mode = ssl.CERT_NONE
-                ssock = context.wrap_socket(sock, server_hostname=host)
-            except Exception as e:
-                
-                return {"error": f"Could not establish SSL/TLS connection: {e}", "valid": False}
+            return {"error": f"Could not establish SSL/TLS connection: {e}", "valid": False}
 
-        if ssock:
+        if record:
             try:
                 # Try to get certificate in standard format first
-                cert = ssock.getpeercert()
+                cert = record["peercert"]
                 if cert and cert.get('subject'):
                     # Standard format worked
                     not_after = cert.get('notAfter')
@@ -473,7 +933,7 @@ def get_cert_info(host, port):
                     issuer = cert.get('issuer')
                 else:
                     # Fall back to binary format and parse manually
-                    cert_der = ssock.getpeercert(binary_form=True)
+                    cert_der = record["der"]
                     if cert_der:
                         try:
                             from OpenSSL import crypto
@@ -565,7 +1025,6 @@ def get_cert_info(host, port):
                         # Date parsing failed, assume valid
                         pass
                         
-                ssock.close()
                 return {
                     "subject": subject,
                     "issuer": issuer,
@@ -576,9 +1035,7 @@ def get_cert_info(host, port):
                     "valid": valid
                 }
             except Exception as e:
-                # Error processing certificate, close socket and return error
-                if ssock:
-                    ssock.close()
+                # Error processing certificate, return error
                 return {"error": f"Error processing certificate: {e}", "valid": False}
         else:
             return {"error": "Could not establish SSL/TLS connection", "valid": False}
@@ -706,6 +1163,14 @@ def compute_ssl_grade(results, cert_info, protocol_support, cipher_strength, por
                 grade = "C"
                 reasons.append(f"Weak: {vuln}")
 
+    # Probes cut short by the scan deadline never established their "not vulnerable",
+    # so only an F (which nothing they could find would lift) is still a grade
+    timed_out = [name.removesuffix("_error") for name, result in results.items() if isinstance(result, dict) and result.get("status") == "timed out"]
+    if timed_out:
+        if grade != "F":
+            grade = "N/A"
+        reasons.append(f"Incomplete scan: {', '.join(timed_out)} did not finish within the {SCAN_DEADLINE}s scan deadline")
+
     return {"grade": grade, "reasons": reasons}
 
 def detect_basic_service(host, port):
@@ -766,25 +1231,95 @@ def detect_basic_service(host, port):
     except Exception as e:
         return {"error": f"Service detection failed: {str(e)}"}
 
-def main():
-    if len(sys.argv) != 3:
-        print(json.dumps({"error": "Usage: ssl_vuln_scanner.py host port"}))
-        sys.exit(1)
-    host = sys.argv[1]
-    port = int(sys.argv[2])
-    
+VULN_CHECKS = [
+    ("Heartbleed", check_heartbleed),
+    ("POODLE", check_poodle),
+    ("BEAST", check_beast),
+    ("CRIME", check_crime),
+    ("BREACH", check_breach),
+    ("FREAK", check_freak),
+    ("LOGJAM", check_logjam),
+    ("DROWN", check_drown),
+    ("ROBOT", check_robot),
+    ("SWEET32", check_sweet32),
+    ("Ticketbleed", check_ticketbleed),
+]
+
+# Worst grade last; N/A (no TLS service at an address) never outranks a real grade
+GRADE_ORDER = ["N/A", "A", "B", "C", "F"]
+
+def timed_out_protocols():
+    return [], 0, {"status": "timed out", "info": f"Protocol detection did not finish within the {SCAN_DEADLINE}s scan deadline"}
+
+def timed_out_cert_info():
+    return {"error": f"Certificate retrieval did not finish within the {SCAN_DEADLINE}s scan deadline", "valid": False}
+
+def run_gates(runner, sessions):
+    """
+    Run the reachability gate of every (tag, session) pair at once and return
+    {tag: error} for the ones that failed it
+    """
+    for tag, session in sessions:
+        runner.submit((tag, "reachability"), None, session.check_reachable)
+    runner.wait([(tag, "reachability") for tag, _ in sessions])
+    failures = {}
+    for tag, _ in sessions:
+        try:
+            if not runner.finished((tag, "reachability")):
+                raise TimeoutError(f"Reachability check did not finish within the {SCAN_DEADLINE}s scan deadline")
+            runner.result((tag, "reachability"), None)
+        except Exception as e:
+            failures[tag] = e
+    return failures
+
+def submit_scan(runner, tag, session):
+    # Probes run side by side; the shared session makes sure handshakes they
+    # have in common are only performed once, and takes the address's
+    # connection slot per connection rather than per probe.
+    host, port = session.host, session.port
+    for name, check in VULN_CHECKS:
+        runner.submit((tag, name), None, check, host, port, session)
+    runner.submit((tag, "protocols"), None, detect_protocols_and_ciphers, host, port, session)
+    runner.submit((tag, "cert_info"), None, get_cert_info, host, port, session)
+
+def unreachable_results(error):
+    """
+    Check results and cert_info for a target that failed the reachability
+    gate: no probe ran, so each one says why
+    """
+    if isinstance(error, StartTLSError):
+        info = f"Not tested: server does not offer STARTTLS ({error})"
+        return {name: {"status": "not tested", "info": info} for name, _ in VULN_CHECKS}, {"error": f"No STARTTLS: {error}", "valid": False}
+    info = f"Not tested: target unreachable ({error})"
+    results = {name: {"status": "not tested", "info": info} for name, _ in VULN_CHECKS}
+    return results, {"error": f"Target unreachable: {error}", "valid": False}
+
+def collect_vulnerabilities(runner, tag):
+    # Rebuild the results in VULN_CHECKS order so the JSON output keeps its shape
+    results = {}
+    for name, _ in VULN_CHECKS:
+        try:
+            results[name] = runner.result((tag, name), timed_out_result(name))
+        except Exception as e:
+            results[name] = {"status": "error", "info": f"Error: {e}"}
+    return results
+
+def scan_target(host, port, starttls=None, timings=False):
+    """
+    Run the full scan of one host/port and return the output document.
+    starttls names a STARTTLS_PROTOCOLS entry for ports not in STARTTLS_PORTS;
+    timings adds per-probe connect/handshake/total durations to the output.
+    """
     # Check if port is definitively NOT an SSL/TLS service
     # Only block ports that are clearly non-SSL/TLS protocols
     non_ssl_ports = {
         22: "SSH",
-        21: "FTP (control)",
         20: "FTP (data)",
         23: "Telnet",
         53: "DNS",
         161: "SNMP",
         162: "SNMP Trap",
         3306: "MySQL",
-        5432: "PostgreSQL",
         6379: "Redis",
         27017: "MongoDB",
         1433: "SQL Server",
@@ -795,8 +1330,8 @@ def main():
         194: "IRC"
     }
     
-    # Only block if it's a definitively non-SSL/TLS port
-    if port in non_ssl_ports:
+    # Only block if it's a definitively non-SSL/TLS port (and the caller did not ask for STARTTLS on it)
+    if port in non_ssl_ports and not starttls:
         service_name = non_ssl_ports[port]
         # Try to detect what's actually running
         service_info = detect_basic_service(host, port)
@@ -809,7 +1344,7 @@ def main():
         elif service_info.get("error"):
             info_message += f" Service detection: {service_info['error']}"
         
-        info_message += " If you believe this port is running an SSL/TLS service, please verify the port number. Common SSL/TLS ports include: HTTPS (443), SMTPS (465), IMAPS (993), POP3S (995), LDAPS (636), FTPS (989/990), and STARTTLS ports (25, 110, 143, 587)."
+        info_message += " If you believe this port is running an SSL/TLS service, please verify the port number. Common SSL/TLS ports include: HTTPS (443), SMTPS (465), IMAPS (993), POP3S (995), LDAPS (636), FTPS (989/990), and STARTTLS ports (21, 25, 110, 143, 389, 587, 5222, 5269, 5432)."
         
         output = {
             "error": f"Port {port} is not an SSL/TLS service port",
@@ -822,76 +1357,119 @@ def main():
             "grade": "N/A",
             "grade_breakdown": [f"Port {port} is not an SSL/TLS service port"]
         }
-        print(json.dumps(output))
-        return
+        return output
     
-    results = {}
-    results["Heartbleed"] = check_heartbleed(host, port)
-    results["POODLE"] = check_poodle(host, port)
-    results["BEAST"] = check_beast(host, port)
-    results["CRIME"] = check_crime(host, port)
-    results["BREACH"] = check_breach(host, port)
-    results["FREAK"] = check_freak(host, port)
-    results["LOGJAM"] = check_logjam(host, port)
-    results["DROWN"] = check_drown(host, port)
-    results["ROBOT"] = check_robot(host, port)
-    results["SWEET32"] = check_sweet32(host, port)
-    results["Ticketbleed"] = check_ticketbleed(host, port)
+    try:
+        addresses = resolve_addresses(host, port)
+    except socket.gaierror:
+        # Let the probes fail on the host name so the output reports the resolution error as before
+        addresses = [None]
 
+    runner = ProbeRunner()
     http_redirect_status = None
     https_redirect_results = {}
 
-    # New: HTTP redirect check for port 80
+    # The redirect check decides whether a second target gets scanned, so start it alongside the main probes
     if port == 80:
-        http_redirect_status = check_http_redirect_to_https(host, port)
-        results["http_redirect_status"] = http_redirect_status
+        runner.submit(("http", "redirect"), host, check_http_redirect_to_https, host, port)
+    # Every address is scanned on its own: behind a load balancer they can be different servers.
+    # Addresses that fail the reachability gate get no probes at all.
+    sessions = {address: ScanSession(host, port, address, starttls, runner.deadline) for address in addresses}
+    unreachable = run_gates(runner, list(sessions.items()))
+    for address, session in sessions.items():
+        if address not in unreachable:
+            submit_scan(runner, address, session)
+
+    if port == 80:
+        runner.wait([("http", "redirect")])
+        http_redirect_status = runner.result(("http", "redirect"), {"status": "timed out", "info": "HTTP redirect check did not finish within the scan deadline"})
         if http_redirect_status.get("status") == "redirects_to_https":
             redirect_url = http_redirect_status.get("info").split("Redirects to ")[1]
             parsed_url = urlparse(redirect_url)
             redirect_host = parsed_url.hostname
             redirect_port = parsed_url.port if parsed_url.port else 443 # Default to 443 for HTTPS
+            try:
+                redirect_address = resolve_addresses(redirect_host, redirect_port)[0]
+            except socket.gaierror:
+                redirect_address = None
 
             # Perform a full SSL scan on the redirected HTTPS endpoint
-            https_redirect_results["Heartbleed"] = check_heartbleed(redirect_host, redirect_port)
-            https_redirect_results["POODLE"] = check_poodle(redirect_host, redirect_port)
-            https_redirect_results["BEAST"] = check_beast(redirect_host, redirect_port)
-            https_redirect_results["CRIME"] = check_crime(redirect_host, redirect_port)
-            https_redirect_results["BREACH"] = check_breach(redirect_host, redirect_port)
-            https_redirect_results["FREAK"] = check_freak(redirect_host, redirect_port)
-            https_redirect_results["LOGJAM"] = check_logjam(redirect_host, redirect_port)
-            https_redirect_results["DROWN"] = check_drown(redirect_host, redirect_port)
-            https_redirect_results["ROBOT"] = check_robot(redirect_host, redirect_port)
-            https_redirect_results["SWEET32"] = check_sweet32(redirect_host, redirect_port)
-            https_redirect_results["Ticketbleed"] = check_ticketbleed(redirect_host, redirect_port)
+            redirect_session = ScanSession(redirect_host, redirect_port, redirect_address, deadline=runner.deadline)
+            redirect_error = run_gates(runner, [("redirect", redirect_session)]).get("redirect")
+            if redirect_error:
+                results, cert_info = unreachable_results(redirect_error)
+                https_redirect_results.update(results, protocol_support=[], cipher_strength=0, cert_info=cert_info)
+            else:
+                submit_scan(runner, "redirect", redirect_session)
 
-            try:
-                https_protocol_support, https_cipher_strength, https_protocol_detection_status = detect_protocols_and_ciphers(redirect_host, redirect_port)
-                https_redirect_results["protocol_support"] = https_protocol_support
-                https_redirect_results["cipher_strength"] = https_cipher_strength
-                https_redirect_results["protocol_detection_status"] = https_protocol_detection_status
-            except Exception as e:
-                https_redirect_results["protocol_detection_error"] = {"status": "error", "info": f"Protocol detection failed for redirected HTTPS: {e}"}
+    runner.wait()
 
-            try:
-                https_cert_info = get_cert_info(redirect_host, redirect_port)
-                https_redirect_results["cert_info"] = https_cert_info
-            except Exception as e:
-                https_redirect_results["cert_info_error"] = {"error": str(e), "valid": False}
+    # New: HTTP redirect check for port 80
+    if port == 80 and http_redirect_status.get("status") == "redirects_to_https" and not https_redirect_results:
+        https_redirect_results.update(collect_vulnerabilities(runner, "redirect"))
+
+        try:
+            https_protocol_support, https_cipher_strength, https_protocol_detection_status = runner.result(("redirect", "protocols"), timed_out_protocols())
+            https_redirect_results["protocol_support"] = https_protocol_support
+            https_redirect_results["cipher_strength"] = https_cipher_strength
+            https_redirect_results["protocol_detection_status"] = https_protocol_detection_status
+        except Exception as e:
+            https_redirect_results["protocol_detection_error"] = {"status": "error", "info": f"Protocol detection failed for redirected HTTPS: {e}"}
+
+        try:
+            https_cert_info = runner.result(("redirect", "cert_info"), timed_out_cert_info())
+            https_redirect_results["cert_info"] = https_cert_info
+        except Exception as e:
+            https_redirect_results["cert_info_error"] = {"error": str(e), "valid": False}
+
+    outputs = []
+    for address in addresses:
+        if address in unreachable:
+            output = unreachable_output(port, unreachable[address], http_redirect_status, https_redirect_results)
+        else:
+            output = collect_target(runner, address, host, port, address, http_redirect_status, https_redirect_results)
+        if timings:
+            output["timings"] = collect_timings(runner, address, sessions[address])
+        outputs.append(output)
+    if len(outputs) == 1:
+        return outputs[0]
+
+    # The target is only as strong as its weakest address
+    worst = max(range(len(outputs)), key=lambda i: GRADE_ORDER.index(outputs[i]["grade"]))
+    output = dict(outputs[worst])
+    output["grade_breakdown"] = output["grade_breakdown"] + [f"Graded on {addresses[worst]}, the weakest of {len(addresses)} addresses"]
+    output["addresses"] = [dict(address=address, **result) for address, result in zip(addresses, outputs)]
+    return output
+
+def collect_target(runner, tag, host, port, address, http_redirect_status=None, https_redirect_results=None):
+    """
+    Build the output document for one scanned address from its finished probes
+    """
+    results = collect_vulnerabilities(runner, tag)
+
+    if port == 80:
+        results["http_redirect_status"] = http_redirect_status
 
     # New: protocol/cipher/cert info
     try:
-        protocol_support, cipher_strength, protocol_detection_status = detect_protocols_and_ciphers(host, port)
+        protocol_support, cipher_strength, protocol_detection_status = runner.result((tag, "protocols"), timed_out_protocols())
+        cipher_suites = protocol_detection_status.pop("cipher_suites", None)
         if protocol_detection_status and protocol_detection_status.get("status") == "not_applicable":
             results["protocol_detection_status"] = protocol_detection_status
+        elif not runner.finished((tag, "protocols")) or protocol_detection_status.get("status") == "timed out":
+            results["protocol_detection_error"] = protocol_detection_status
     except Exception as e:
         protocol_support = []
         cipher_strength = 0
+        cipher_suites = None
         results["protocol_detection_error"] = {"status": "error", "info": f"Protocol detection failed: {e}"}
 
     try:
-        cert_info = get_cert_info(host, port)
+        cert_info = runner.result((tag, "cert_info"), timed_out_cert_info())
         if cert_info and cert_info.get("status") == "not_applicable":
             results["cert_info_status"] = cert_info
+        elif not runner.finished((tag, "cert_info")):
+            results["cert_info_error"] = {"status": "timed out", "info": cert_info["error"]}
     except Exception as e:
         cert_info = {"error": str(e), "valid": False}
         results["cert_info_error"] = {"status": "error", "info": f"Certificate information retrieval failed: {e}"}
@@ -899,7 +1477,9 @@ def main():
     # If no SSL/TLS service was detected, try basic service detection
     service_detection = None
     if not protocol_support and cert_info and cert_info.get("error"):
-        service_detection = detect_basic_service(host, port)
+        runner.submit((tag, "service"), address or host, detect_basic_service, address or host, port)
+        runner.wait([(tag, "service")])
+        service_detection = runner.result((tag, "service"), {"error": "Service detection timed out"})
     
     grade_info = compute_ssl_grade(results, cert_info, protocol_support, cipher_strength, port, http_redirect_status, https_redirect_results)
     output = {
@@ -911,11 +1491,243 @@ def main():
         "grade_breakdown": grade_info["reasons"]
     }
     
+    # Every accepted suite per protocol version, from the raw ClientHello enumeration
+    if cipher_suites:
+        output["cipher_suites"] = cipher_suites
+
     # Add service detection if available
     if service_detection and not service_detection.get("error"):
         output["service_detection"] = service_detection
     
-    print(json.dumps(output))
+    return output
+
+def unreachable_output(port, error, http_redirect_status=None, https_redirect_results=None):
+    """
+    Build the output document for an address that failed the reachability gate
+    """
+    results, cert_info = unreachable_results(error)
+    if port == 80:
+        results["http_redirect_status"] = http_redirect_status
+    if isinstance(error, StartTLSError):
+        # Graded here: the error text mentions TLS, which compute_ssl_grade would take for a TLS service
+        grade_info = {"grade": "N/A", "reasons": ["Server does not offer STARTTLS - no SSL/TLS service detected"]}
+    else:
+        grade_info = compute_ssl_grade(results, cert_info, [], 0, port, http_redirect_status, https_redirect_results)
+    return {
+        "results": results,
+        "protocol_support": [],
+        "cipher_strength": 0,
+        "cert_info": cert_info,
+        "grade": grade_info["grade"],
+        "grade_breakdown": grade_info["reasons"]
+    }
+
+def collect_timings(runner, tag, session):
+    """
+    The optional "timings" section: the probe timeout the gate settled on and,
+    per probe, the seconds its own connections spent connecting, in STARTTLS and
+    in handshakes, plus its total run time. A total can exceed the parts when a
+    probe waited on a handshake another probe performed, and the parts can
+    exceed the total when a probe's connections ran in parallel.
+    """
+    with session.lock:
+        probes = {label: dict(phases) for label, phases in session.timings.items()}
+    for name, seconds in runner.durations(tag).items():
+        probes.setdefault(name, {})["total"] = seconds
+    return {
+        "probe_timeout": round(session.timeout, 3),
+        "probes": {label: {phase: round(seconds, 4) for phase, seconds in phases.items()} for label, phases in sorted(probes.items())},
+    }
+
+def fingerprint_target(host, port, starttls=None, address=None):
+    """
+    One baseline handshake, returning the SHA-256 fingerprint of the leaf
+    certificate. address pins the connection to one IP of a multi-address host.
+    """
+    record = ScanSession(host, port, address, starttls).handshake()
+    return {"fingerprint": hashlib.sha256(record["der"]).hexdigest() if record["der"] else None}
+
+# Operations a --serve job may ask for
+JOB_OPERATIONS = {
+    "scan": scan_target,
+    "fingerprint": fingerprint_target,
+}
+
+def preload():
+    # Pay the lazy imports and context construction once, before the first job arrives
+    for module in ("requests", "OpenSSL.SSL", "OpenSSL.crypto"):
+        try:
+            __import__(module)
+        except ImportError:
+            pass
+    for name in CONTEXT_FACTORIES:
+        try:
+            shared_context(name)
+        except Exception:
+            pass
+
+def run_jobs(jobs, max_jobs, per_host=None):
+    """
+    Run jobs from an iterator of (envelope, host, port, operation) tuples and
+    write each envelope, extended with "result" or "error", as one NDJSON line
+    as soon as it completes. A job with host None is written out unchanged.
+    At most max_jobs scans run at once (and at most per_host against one
+    host); the iterator is only advanced when a slot frees up, so memory use
+    does not depend on how many jobs there are. A job waits for its host
+    before it takes one of the max_jobs slots, so jobs for a busy host only
+    ever hold read-ahead slots.
+    """
+    write_lock = threading.Lock()
+    host_scans = KeyedSlots(per_host) if per_host else None
+    running = threading.BoundedSemaphore(max_jobs)
+    backlog = max_jobs * BATCH_LOOKAHEAD if host_scans else max_jobs
+    admitted = threading.BoundedSemaphore(backlog)
+
+    def emit(message):
+        with write_lock:
+            sys.stdout.write(json.dumps(message) + "\n")
+            sys.stdout.flush()
+
+    def run_job(envelope, host, port, operation):
+        try:
+            with host_scans.hold(host) if host_scans else nullcontext(), running:
+                envelope["result"] = operation(host, port)
+        except Exception as e:
+            envelope["error"] = f"Scan failed: {e}"
+        finally:
+            admitted.release()
+        emit(envelope)
+
+    for envelope, host, port, operation in jobs:
+        if host is None:
+            emit(envelope)
+            continue
+        # Stop reading while the backlog is full so the producer sees back-pressure
+        admitted.acquire()
+        threading.Thread(target=run_job, args=(envelope, host, port, operation), daemon=True).start()
+
+    # Input exhausted: let in-flight jobs finish before returning
+    for _ in range(backlog):
+        admitted.acquire()
+
+def serve_jobs(lines):
+    # --serve input: one JSON object {"id", "host", "port", "op", "starttls", "timings", "address"} per line; op defaults to "scan"
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        job = None
+        try:
+            job = json.loads(line)
+            if not isinstance(job, dict) or "host" not in job or "port" not in job:
+                raise ValueError("job must be an object with host and port")
+            if not isinstance(job["host"], str) or not job["host"]:
+                raise ValueError("host must be a non-empty string")
+            if job.get("op", "scan") not in JOB_OPERATIONS:
+                raise ValueError(f"unknown op {job['op']!r}")
+            operation = JOB_OPERATIONS[job.get("op", "scan")]
+            options = {}
+            if job.get("starttls"):
+                if job["starttls"] not in STARTTLS_PROTOCOLS:
+                    raise ValueError(f"unknown starttls protocol {job['starttls']!r}")
+                options["starttls"] = job["starttls"]
+            if job.get("timings"):
+                if operation is not scan_target:
+                    raise ValueError("timings is only available for scan jobs")
+                options["timings"] = True
+            if job.get("address"):
+                if operation is not fingerprint_target:
+                    raise ValueError("address is only available for fingerprint jobs")
+                if not isinstance(job["address"], str):
+                    raise ValueError("address must be a string")
+                options["address"] = job["address"]
+            if options:
+                operation = partial(operation, **options)
+            port = int(job["port"])
+        except (ValueError, TypeError) as e:
+            # TypeError covers a null port or a list where a name was expected; one bad line must not end the worker
+            yield {"id": job.get("id") if isinstance(job, dict) else None, "error": f"Invalid job: {e}"}, None, None, None
+            continue
+        yield {"id": job.get("id")}, job["host"], port, operation
+
+def parse_target(text, default_port=443):
+    """
+    Parse "host port", "host:port", "[v6addr]:port" or a bare host
+    """
+    parts = text.split()
+    if len(parts) == 2:
+        return parts[0], int(parts[1])
+    if len(parts) != 1:
+        raise ValueError(f"cannot parse target {text!r}")
+    target = parts[0]
+    if target.startswith("["):
+        host, _, rest = target[1:].partition("]")
+        return host, int(rest[1:]) if rest.startswith(":") else default_port
+    if target.count(":") == 1:
+        host, port = target.split(":")
+        return host, int(port)
+    return target, default_port
+
+def batch_jobs(lines, starttls=None, timings=False):
+    # --batch input: one target per line, blank lines and #-comments ignored
+    operation = partial(scan_target, starttls=starttls, timings=timings)
+    for line in lines:
+        line = line.split("#", 1)[0].strip()
+        if not line:
+            continue
+        try:
+            host, port = parse_target(line)
+        except ValueError as e:
+            yield {"target": line, "error": f"Invalid target: {e}"}, None, None, None
+            continue
+        yield {"host": host, "port": port}, host, port, operation
+
+def serve():
+    """
+    Worker mode: read newline-delimited JSON jobs ({"id", "host", "port", "op"})
+    from stdin and write one {"id", "result"} or {"id", "error"} line per job to
+    stdout. op is "scan" (the default) or "fingerprint"; an optional "starttls"
+    forces a STARTTLS protocol for the port, "timings": true adds the timings
+    section to a scan result, and "address" pins a fingerprint to one IP.
+    Up to SERVE_MAX_JOBS jobs run at once; output order follows completion order.
+    """
+    preload()
+    run_jobs(serve_jobs(sys.stdin), SERVE_MAX_JOBS)
+
+def batch(path, concurrency, per_host, starttls=None, timings=False):
+    """
+    Batch mode: scan every target listed in path ("-" for stdin) and stream one
+    {"host", "port", "result"} NDJSON line per target as each scan finishes.
+    """
+    preload()
+    if path == "-":
+        run_jobs(batch_jobs(sys.stdin, starttls, timings), concurrency, per_host)
+    else:
+        with open(path) as targets:
+            run_jobs(batch_jobs(targets, starttls, timings), concurrency, per_host)
+
+def main():
+    parser = argparse.ArgumentParser(description="SSL/TLS vulnerability scanner")
+    parser.add_argument("host", nargs="?")
+    parser.add_argument("port", nargs="?", type=int)
+    parser.add_argument("--serve", action="store_true", help="read NDJSON jobs from stdin (worker mode)")
+    parser.add_argument("--batch", metavar="FILE", help="scan targets listed in FILE ('-' for stdin), streaming NDJSON")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY, help="targets scanned at once in --batch mode")
+    parser.add_argument("--per-host", type=int, default=BATCH_PER_HOST, help="targets on the same host scanned at once in --batch mode")
+    parser.add_argument("--starttls", choices=sorted(STARTTLS_PROTOCOLS), help="negotiate STARTTLS with this protocol first (default: by port)")
+    parser.add_argument("--timings", action="store_true", help="add per-probe connect/handshake/total durations to the output")
+    args = parser.parse_args()
+
+    if args.serve:
+        serve()
+        return
+    if args.batch:
+        batch(args.batch, max(1, args.concurrency), max(1, args.per_host), args.starttls, args.timings)
+        return
+    if args.host is None or args.port is None:
+        print(json.dumps({"error": "Usage: ssl_vuln_scanner.py host port | --serve | --batch FILE"}))
+        sys.exit(1)
+    print(json.dumps(scan_target(args.host, args.port, args.starttls, args.timings)))
 
 if __name__ == "__main__":
     main()
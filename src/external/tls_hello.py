@@ -0,0 +1,524 @@
+#!/usr/bin/env python3
+"""
+Hand-built ClientHello / ServerHello codec.
+
+Everything here is plain bytes over a plain socket, so it does not depend on
+what the local OpenSSL build is willing to offer: SSLv2, SSLv3, export and
+other long-disabled cipher suites can all be put on the wire. Only the first
+flight of the handshake is exchanged; no keys are ever derived.
+"""
+import ipaddress
+import os
+import re
+import struct
+import threading
+import time
+
+SSL2 = 0x0002
+SSL3 = 0x0300
+TLS10 = 0x0301
+TLS11 = 0x0302
+TLS12 = 0x0303
+TLS13 = 0x0304
+
+# Names match the ones used in protocol_support
+VERSIONS = {
+    "TLSv1.3": TLS13,
+    "TLSv1.2": TLS12,
+    "TLSv1.1": TLS11,
+    "TLSv1.0": TLS10,
+    "SSLv3": SSL3,
+    "SSLv2": SSL2,
+}
+
+# A version's offer is split into this many disjoint groups, each enumerated
+# on its own connections at the same time, so the rounds do not all queue up
+ENUMERATION_GROUPS = 4
+
+# SSLv3 - TLS 1.2 cipher suites by IANA code point
+CIPHER_SUITES = {
+    0x0001: "TLS_RSA_WITH_NULL_MD5",
+    0x0002: "TLS_RSA_WITH_NULL_SHA",
+    0x0003: "TLS_RSA_EXPORT_WITH_RC4_40_MD5",
+    0x0004: "TLS_RSA_WITH_RC4_128_MD5",
+    0x0005: "TLS_RSA_WITH_RC4_128_SHA",
+    0x0006: "TLS_RSA_EXPORT_WITH_RC2_CBC_40_MD5",
+    0x0007: "TLS_RSA_WITH_IDEA_CBC_SHA",
+    0x0008: "TLS_RSA_EXPORT_WITH_DES40_CBC_SHA",
+    0x0009: "TLS_RSA_WITH_DES_CBC_SHA",
+    0x000A: "TLS_RSA_WITH_3DES_EDE_CBC_SHA",
+    0x000B: "TLS_DH_DSS_EXPORT_WITH_DES40_CBC_SHA",
+    0x000C: "TLS_DH_DSS_WITH_DES_CBC_SHA",
+    0x000D: "TLS_DH_DSS_WITH_3DES_EDE_CBC_SHA",
+    0x000E: "TLS_DH_RSA_EXPORT_WITH_DES40_CBC_SHA",
+    0x000F: "TLS_DH_RSA_WITH_DES_CBC_SHA",
+    0x0010: "TLS_DH_RSA_WITH_3DES_EDE_CBC_SHA",
+    0x0011: "TLS_DHE_DSS_EXPORT_WITH_DES40_CBC_SHA",
+    0x0012: "TLS_DHE_DSS_WITH_DES_CBC_SHA",
+    0x0013: "TLS_DHE_DSS_WITH_3DES_EDE_CBC_SHA",
+    0x0014: "TLS_DHE_RSA_EXPORT_WITH_DES40_CBC_SHA",
+    0x0015: "TLS_DHE_RSA_WITH_DES_CBC_SHA",
+    0x0016: "TLS_DHE_RSA_WITH_3DES_EDE_CBC_SHA",
+    0x0017: "TLS_DH_anon_EXPORT_WITH_RC4_40_MD5",
+    0x0018: "TLS_DH_anon_WITH_RC4_128_MD5",
+    0x0019: "TLS_DH_anon_EXPORT_WITH_DES40_CBC_SHA",
+    0x001A: "TLS_DH_anon_WITH_DES_CBC_SHA",
+    0x001B: "TLS_DH_anon_WITH_3DES_EDE_CBC_SHA",
+    0x002F: "TLS_RSA_WITH_AES_128_CBC_SHA",
+    0x0030: "TLS_DH_DSS_WITH_AES_128_CBC_SHA",
+    0x0031: "TLS_DH_RSA_WITH_AES_128_CBC_SHA",
+    0x0032: "TLS_DHE_DSS_WITH_AES_128_CBC_SHA",
+    0x0033: "TLS_DHE_RSA_WITH_AES_128_CBC_SHA",
+    0x0034: "TLS_DH_anon_WITH_AES_128_CBC_SHA",
+    0x0035: "TLS_RSA_WITH_AES_256_CBC_SHA",
+    0x0036: "TLS_DH_DSS_WITH_AES_256_CBC_SHA",
+    0x0037: "TLS_DH_RSA_WITH_AES_256_CBC_SHA",
+    0x0038: "TLS_DHE_DSS_WITH_AES_256_CBC_SHA",
+    0x0039: "TLS_DHE_RSA_WITH_AES_256_CBC_SHA",
+    0x003A: "TLS_DH_anon_WITH_AES_256_CBC_SHA",
+    0x003B: "TLS_RSA_WITH_NULL_SHA256",
+    0x003C: "TLS_RSA_WITH_AES_128_CBC_SHA256",
+    0x003D: "TLS_RSA_WITH_AES_256_CBC_SHA256",
+    0x003E: "TLS_DH_DSS_WITH_AES_128_CBC_SHA256",
+    0x003F: "TLS_DH_RSA_WITH_AES_128_CBC_SHA256",
+    0x0040: "TLS_DHE_DSS_WITH_AES_128_CBC_SHA256",
+    0x0041: "TLS_RSA_WITH_CAMELLIA_128_CBC_SHA",
+    0x0042: "TLS_DH_DSS_WITH_CAMELLIA_128_CBC_SHA",
+    0x0043: "TLS_DH_RSA_WITH_CAMELLIA_128_CBC_SHA",
+    0x0044: "TLS_DHE_DSS_WITH_CAMELLIA_128_CBC_SHA",
+    0x0045: "TLS_DHE_RSA_WITH_CAMELLIA_128_CBC_SHA",
+    0x0046: "TLS_DH_anon_WITH_CAMELLIA_128_CBC_SHA",
+    0x0060: "TLS_RSA_EXPORT1024_WITH_RC4_56_MD5",
+    0x0061: "TLS_RSA_EXPORT1024_WITH_RC2_CBC_56_MD5",
+    0x0062: "TLS_RSA_EXPORT1024_WITH_DES_CBC_SHA",
+    0x0063: "TLS_DHE_DSS_EXPORT1024_WITH_DES_CBC_SHA",
+    0x0064: "TLS_RSA_EXPORT1024_WITH_RC4_56_SHA",
+    0x0065: "TLS_DHE_DSS_EXPORT1024_WITH_RC4_56_SHA",
+    0x0066: "TLS_DHE_DSS_WITH_RC4_128_SHA",
+    0x0067: "TLS_DHE_RSA_WITH_AES_128_CBC_SHA256",
+    0x0068: "TLS_DH_DSS_WITH_AES_256_CBC_SHA256",
+    0x0069: "TLS_DH_RSA_WITH_AES_256_CBC_SHA256",
+    0x006A: "TLS_DHE_DSS_WITH_AES_256_CBC_SHA256",
+    0x006B: "TLS_DHE_RSA_WITH_AES_256_CBC_SHA256",
+    0x006C: "TLS_DH_anon_WITH_AES_128_CBC_SHA256",
+    0x006D: "TLS_DH_anon_WITH_AES_256_CBC_SHA256",
+    0x0084: "TLS_RSA_WITH_CAMELLIA_256_CBC_SHA",
+    0x0085: "TLS_DH_DSS_WITH_CAMELLIA_256_CBC_SHA",
+    0x0086: "TLS_DH_RSA_WITH_CAMELLIA_256_CBC_SHA",
+    0x0087: "TLS_DHE_DSS_WITH_CAMELLIA_256_CBC_SHA",
+    0x0088: "TLS_DHE_RSA_WITH_CAMELLIA_256_CBC_SHA",
+    0x0089: "TLS_DH_anon_WITH_CAMELLIA_256_CBC_SHA",
+    0x0096: "TLS_RSA_WITH_SEED_CBC_SHA",
+    0x0099: "TLS_DHE_DSS_WITH_SEED_CBC_SHA",
+    0x009A: "TLS_DHE_RSA_WITH_SEED_CBC_SHA",
+    0x009C: "TLS_RSA_WITH_AES_128_GCM_SHA256",
+    0x009D: "TLS_RSA_WITH_AES_256_GCM_SHA384",
+    0x009E: "TLS_DHE_RSA_WITH_AES_128_GCM_SHA256",
+    0x009F: "TLS_DHE_RSA_WITH_AES_256_GCM_SHA384",
+    0x00A2: "TLS_DHE_DSS_WITH_AES_128_GCM_SHA256",
+    0x00A3: "TLS_DHE_DSS_WITH_AES_256_GCM_SHA384",
+    0x00A6: "TLS_DH_anon_WITH_AES_128_GCM_SHA256",
+    0x00A7: "TLS_DH_anon_WITH_AES_256_GCM_SHA384",
+    0x00BA: "TLS_RSA_WITH_CAMELLIA_128_CBC_SHA256",
+    0x00BE: "TLS_DHE_RSA_WITH_CAMELLIA_128_CBC_SHA256",
+    0x00C0: "TLS_RSA_WITH_CAMELLIA_256_CBC_SHA256",
+    0x00C4: "TLS_DHE_RSA_WITH_CAMELLIA_256_CBC_SHA256",
+    0xC001: "TLS_ECDH_ECDSA_WITH_NULL_SHA",
+    0xC002: "TLS_ECDH_ECDSA_WITH_RC4_128_SHA",
+    0xC003: "TLS_ECDH_ECDSA_WITH_3DES_EDE_CBC_SHA",
+    0xC004: "TLS_ECDH_ECDSA_WITH_AES_128_CBC_SHA",
+    0xC005: "TLS_ECDH_ECDSA_WITH_AES_256_CBC_SHA",
+    0xC006: "TLS_ECDHE_ECDSA_WITH_NULL_SHA",
+    0xC007: "TLS_ECDHE_ECDSA_WITH_RC4_128_SHA",
+    0xC008: "TLS_ECDHE_ECDSA_WITH_3DES_EDE_CBC_SHA",
+    0xC009: "TLS_ECDHE_ECDSA_WITH_AES_128_CBC_SHA",
+    0xC00A: "TLS_ECDHE_ECDSA_WITH_AES_256_CBC_SHA",
+    0xC00B: "TLS_ECDH_RSA_WITH_NULL_SHA",
+    0xC00C: "TLS_ECDH_RSA_WITH_RC4_128_SHA",
+    0xC00D: "TLS_ECDH_RSA_WITH_3DES_EDE_CBC_SHA",
+    0xC00E: "TLS_ECDH_RSA_WITH_AES_128_CBC_SHA",
+    0xC00F: "TLS_ECDH_RSA_WITH_AES_256_CBC_SHA",
+    0xC010: "TLS_ECDHE_RSA_WITH_NULL_SHA",
+    0xC011: "TLS_ECDHE_RSA_WITH_RC4_128_SHA",
+    0xC012: "TLS_ECDHE_RSA_WITH_3DES_EDE_CBC_SHA",
+    0xC013: "TLS_ECDHE_RSA_WITH_AES_128_CBC_SHA",
+    0xC014: "TLS_ECDHE_RSA_WITH_AES_256_CBC_SHA",
+    0xC015: "TLS_ECDH_anon_WITH_NULL_SHA",
+    0xC016: "TLS_ECDH_anon_WITH_RC4_128_SHA",
+    0xC017: "TLS_ECDH_anon_WITH_3DES_EDE_CBC_SHA",
+    0xC018: "TLS_ECDH_anon_WITH_AES_128_CBC_SHA",
+    0xC019: "TLS_ECDH_anon_WITH_AES_256_CBC_SHA",
+    0xC023: "TLS_ECDHE_ECDSA_WITH_AES_128_CBC_SHA256",
+    0xC024: "TLS_ECDHE_ECDSA_WITH_AES_256_CBC_SHA384",
+    0xC025: "TLS_ECDH_ECDSA_WITH_AES_128_CBC_SHA256",
+    0xC026: "TLS_ECDH_ECDSA_WITH_AES_256_CBC_SHA384",
+    0xC027: "TLS_ECDHE_RSA_WITH_AES_128_CBC_SHA256",
+    0xC028: "TLS_ECDHE_RSA_WITH_AES_256_CBC_SHA384",
+    0xC029: "TLS_ECDH_RSA_WITH_AES_128_CBC_SHA256",
+    0xC02A: "TLS_ECDH_RSA_WITH_AES_256_CBC_SHA384",
+    0xC02B: "TLS_ECDHE_ECDSA_WITH_AES_128_GCM_SHA256",
+    0xC02C: "TLS_ECDHE_ECDSA_WITH_AES_256_GCM_SHA384",
+    0xC02D: "TLS_ECDH_ECDSA_WITH_AES_128_GCM_SHA256",
+    0xC02E: "TLS_ECDH_ECDSA_WITH_AES_256_GCM_SHA384",
+    0xC02F: "TLS_ECDHE_RSA_WITH_AES_128_GCM_SHA256",
+    0xC030: "TLS_ECDHE_RSA_WITH_AES_256_GCM_SHA384",
+    0xC031: "TLS_ECDH_RSA_WITH_AES_128_GCM_SHA256",
+    0xC032: "TLS_ECDH_RSA_WITH_AES_256_GCM_SHA384",
+    0xC050: "TLS_RSA_WITH_ARIA_128_GCM_SHA256",
+    0xC051: "TLS_RSA_WITH_ARIA_256_GCM_SHA384",
+    0xC052: "TLS_DHE_RSA_WITH_ARIA_128_GCM_SHA256",
+    0xC053: "TLS_DHE_RSA_WITH_ARIA_256_GCM_SHA384",
+    0xC05C: "TLS_ECDHE_ECDSA_WITH_ARIA_128_GCM_SHA256",
+    0xC05D: "TLS_ECDHE_ECDSA_WITH_ARIA_256_GCM_SHA384",
+    0xC060: "TLS_ECDHE_RSA_WITH_ARIA_128_GCM_SHA256",
+    0xC061: "TLS_ECDHE_RSA_WITH_ARIA_256_GCM_SHA384",
+    0xC072: "TLS_ECDHE_ECDSA_WITH_CAMELLIA_128_CBC_SHA256",
+    0xC073: "TLS_ECDHE_ECDSA_WITH_CAMELLIA_256_CBC_SHA384",
+    0xC076: "TLS_ECDHE_RSA_WITH_CAMELLIA_128_CBC_SHA256",
+    0xC077: "TLS_ECDHE_RSA_WITH_CAMELLIA_256_CBC_SHA384",
+    0xC09C: "TLS_RSA_WITH_AES_128_CCM",
+    0xC09D: "TLS_RSA_WITH_AES_256_CCM",
+    0xC09E: "TLS_DHE_RSA_WITH_AES_128_CCM",
+    0xC09F: "TLS_DHE_RSA_WITH_AES_256_CCM",
+    0xC0A0: "TLS_RSA_WITH_AES_128_CCM_8",
+    0xC0A1: "TLS_RSA_WITH_AES_256_CCM_8",
+    0xC0AC: "TLS_ECDHE_ECDSA_WITH_AES_128_CCM",
+    0xC0AD: "TLS_ECDHE_ECDSA_WITH_AES_256_CCM",
+    0xC0AE: "TLS_ECDHE_ECDSA_WITH_AES_128_CCM_8",
+    0xC0AF: "TLS_ECDHE_ECDSA_WITH_AES_256_CCM_8",
+    0xCCA8: "TLS_ECDHE_RSA_WITH_CHACHA20_POLY1305_SHA256",
+    0xCCA9: "TLS_ECDHE_ECDSA_WITH_CHACHA20_POLY1305_SHA256",
+    0xCCAA: "TLS_DHE_RSA_WITH_CHACHA20_POLY1305_SHA256",
+}
+
+TLS13_CIPHER_SUITES = {
+    0x1301: "TLS_AES_128_GCM_SHA256",
+    0x1302: "TLS_AES_256_GCM_SHA384",
+    0x1303: "TLS_CHACHA20_POLY1305_SHA256",
+    0x1304: "TLS_AES_128_CCM_SHA256",
+    0x1305: "TLS_AES_128_CCM_8_SHA256",
+}
+
+# SSLv2 cipher specs are three bytes wide
+SSL2_CIPHER_SPECS = {
+    0x010080: "SSL_CK_RC4_128_WITH_MD5",
+    0x020080: "SSL_CK_RC4_128_EXPORT40_WITH_MD5",
+    0x030080: "SSL_CK_RC2_128_CBC_WITH_MD5",
+    0x040080: "SSL_CK_RC2_128_CBC_EXPORT40_WITH_MD5",
+    0x050080: "SSL_CK_IDEA_128_CBC_WITH_MD5",
+    0x060040: "SSL_CK_DES_64_CBC_WITH_MD5",
+    0x0700C0: "SSL_CK_DES_192_EDE3_CBC_WITH_MD5",
+}
+
+# ServerHello.random of a TLS 1.3 HelloRetryRequest (RFC 8446, 4.1.3)
+HELLO_RETRY_RANDOM = bytes.fromhex("cf21ad74e59a6111be1d8c021e65b891c2a211167abb8c5e079e09e2c8a8339c")
+
+# x25519, secp256r1, secp384r1, secp521r1, x448, ffdhe2048, ffdhe3072
+SUPPORTED_GROUPS = [0x001D, 0x0017, 0x0018, 0x0019, 0x001E, 0x0100, 0x0101]
+SIGNATURE_ALGORITHMS = [
+    0x0403, 0x0503, 0x0603, 0x0804, 0x0805, 0x0806, 0x0401, 0x0501, 0x0601,
+    0x0203, 0x0201, 0x0402, 0x0202,
+]
+
+class HelloError(Exception):
+    pass
+
+def cipher_bits(name):
+    """
+    Symmetric key strength of a suite, derived from its name
+    """
+    if name.startswith("SSL_CK_"):
+        # SSLv2 names put the cipher first: SSL_CK_<cipher>_WITH_<mac>
+        cipher = name[len("SSL_CK_"):].split("_WITH_", 1)[0]
+    else:
+        cipher = name.split("_WITH_", 1)[-1] if "_WITH_" in name else name[len("TLS_"):]
+    if "NULL" in cipher:
+        return 0
+    if "_40_" in cipher or "DES40" in cipher or "EXPORT40" in cipher:
+        return 40
+    if "EXPORT1024" in name:
+        return 56
+    if "3DES" in cipher or "DES_192_EDE3" in cipher:
+        return 112
+    if "DES_" in cipher:
+        return 56
+    if re.search(r"(AES|CAMELLIA|ARIA)_256|CHACHA20", cipher):
+        return 256
+    return 128
+
+def suite_name(version, code):
+    if version == SSL2:
+        return SSL2_CIPHER_SPECS.get(code, f"SSL2_UNKNOWN_0x{code:06X}")
+    return TLS13_CIPHER_SUITES.get(code) or CIPHER_SUITES.get(code) or f"TLS_UNKNOWN_0x{code:04X}"
+
+def _is_ip(host):
+    # SNI carries host names only (RFC 6066)
+    try:
+        ipaddress.ip_address(host)
+        return True
+    except ValueError:
+        return False
+
+def _vector(data, length_bytes):
+    return len(data).to_bytes(length_bytes, "big") + data
+
+def _extension(ext_type, data):
+    return struct.pack("!HH", ext_type, len(data)) + data
+
+def build_client_hello(version, suites, server_name=None, heartbeat=False):
+    """
+    Build a complete handshake record holding a ClientHello that offers exactly
+    the given suite code points at the given protocol version.
+    """
+    if version == SSL2:
+        return build_ssl2_client_hello(suites)
+    legacy_version = min(version, TLS12)
+    extensions = b""
+    if version >= TLS10:
+        if server_name and not _is_ip(server_name):
+            host = server_name.encode("idna")
+            extensions += _extension(0x0000, _vector(b"\x00" + _vector(host, 2), 2))
+        extensions += _extension(0x000A, _vector(b"".join(struct.pack("!H", g) for g in SUPPORTED_GROUPS), 2))
+        extensions += _extension(0x000B, _vector(b"\x00", 1))
+        extensions += _extension(0x000D, _vector(b"".join(struct.pack("!H", a) for a in SIGNATURE_ALGORITHMS), 2))
+        if heartbeat:
+            extensions += _extension(0x000F, b"\x01")
+        if version >= TLS13:
+            extensions += _extension(0x002B, _vector(struct.pack("!H", TLS13), 1))
+            # A random x25519 share is enough to get a ServerHello back; we never finish the handshake
+            extensions += _extension(0x0033, _vector(struct.pack("!HH", 0x001D, 32) + os.urandom(32), 2))
+            extensions += _extension(0x002D, _vector(b"\x01", 1))
+    session_id = os.urandom(32) if version >= TLS13 else b""
+    body = (
+        struct.pack("!H", legacy_version) + os.urandom(32) + _vector(session_id, 1)
+        + _vector(b"".join(struct.pack("!H", s) for s in suites), 2)
+        + _vector(b"\x00", 1)
+    )
+    if extensions:
+        # Some TLS terminators hang on ClientHellos of 256-511 bytes; pad past that range (RFC 7685)
+        size = 4 + len(body) + 2 + len(extensions)
+        if 256 <= size < 512:
+            extensions += _extension(0x0015, b"\x00" * max(0, 512 - size - 4))
+        body += _vector(extensions, 2)
+    handshake = b"\x01" + _vector(body, 3)
+    return struct.pack("!BHH", 22, min(legacy_version, TLS10) if version > SSL3 else SSL3, len(handshake)) + handshake
+
+def build_ssl2_client_hello(specs):
+    body = (
+        b"\x01" + struct.pack("!HHHH", SSL2, 3 * len(specs), 0, 16)
+        + b"".join(spec.to_bytes(3, "big") for spec in specs)
+        + os.urandom(16)
+    )
+    return struct.pack("!H", 0x8000 | len(body)) + body
+
+def _recv_exact(sock, size):
+    data = b""
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise HelloError("connection closed by server")
+        data += chunk
+    return data
+
+def read_server_hello(sock):
+    """
+    Read records until the ServerHello arrives. Returns a dict with the
+    negotiated version and cipher suite, or None if the server answered with an
+    alert or hung up, i.e. refused what was offered.
+    """
+    buffered = b""
+    while True:
+        try:
+            header = _recv_exact(sock, 5)
+        except HelloError:
+            return None
+        content_type, _, length = struct.unpack("!BHH", header)
+        if content_type == 21:
+            return None
+        if content_type != 22:
+            raise HelloError(f"unexpected record type {content_type}")
+        buffered += _recv_exact(sock, length)
+        if len(buffered) < 4:
+            continue
+        msg_type = buffered[0]
+        msg_length = int.from_bytes(buffered[1:4], "big")
+        if msg_type != 2:
+            raise HelloError(f"unexpected handshake message {msg_type}")
+        if len(buffered) < 4 + msg_length:
+            continue
+        return _parse_server_hello(buffered[4:4 + msg_length])
+
+def _parse_server_hello(body):
+    version = struct.unpack("!H", body[0:2])[0]
+    random = body[2:34]
+    sid_length = body[34]
+    offset = 35 + sid_length
+    cipher = struct.unpack("!H", body[offset:offset + 2])[0]
+    offset += 3
+    if offset + 2 <= len(body):
+        ext_end = offset + 2 + struct.unpack("!H", body[offset:offset + 2])[0]
+        offset += 2
+        while offset + 4 <= ext_end:
+            ext_type, ext_length = struct.unpack("!HH", body[offset:offset + 4])
+            if ext_type == 0x002B and ext_length == 2:
+                version = struct.unpack("!H", body[offset + 4:offset + 6])[0]
+            offset += 4 + ext_length
+    return {"version": version, "cipher": cipher, "retry": random == HELLO_RETRY_RANDOM}
+
+def read_ssl2_server_hello(sock):
+    """
+    Returns the cipher specs an SSLv2 server lists in its SERVER-HELLO, or None
+    """
+    try:
+        header = _recv_exact(sock, 2)
+    except HelloError:
+        return None
+    if not header[0] & 0x80:
+        # A TLS record (usually an alert): the server does not speak SSLv2
+        return None
+    body = _recv_exact(sock, ((header[0] & 0x7F) << 8) | header[1])
+    if not body or body[0] != 4:
+        return None
+    cert_length, specs_length = struct.unpack("!HH", body[5:9])
+    specs = body[11 + cert_length:11 + cert_length + specs_length]
+    return [int.from_bytes(specs[i:i + 3], "big") for i in range(0, len(specs) - 2, 3)]
+
+class SuiteEnumeration:
+    """
+    Accepted suites per protocol version, plus the error (if any) that
+    stopped enumeration of a version before it learned anything, and the
+    versions whose enumeration was cut short by the stop time (their
+    accepted lists are partial).
+    """
+    def __init__(self):
+        self.codes = {}
+        self.errors = {}
+        self.unfinished = set()
+
+    def accepted(self, version_name):
+        version = VERSIONS[version_name]
+        return [suite_name(version, code) for code in self.codes.get(version_name, [])]
+
+    def error(self, version_name):
+        return self.errors.get(version_name)
+
+    def failure(self):
+        """
+        The error that kept every version from being probed (e.g. connection
+        refused), or None if the server answered at least once
+        """
+        if any(name not in self.errors for name in self.codes):
+            return None
+        return next((self.errors[name] for name in VERSIONS if name in self.errors), None)
+
+    def unfinished_versions(self, versions=None):
+        return [name for name in (versions or VERSIONS) if name in self.unfinished]
+
+    def all_accepted(self):
+        return [(name, suite) for name in VERSIONS for suite in self.accepted(name)]
+
+    def as_dict(self):
+        return {name: self.accepted(name) for name in VERSIONS if self.codes.get(name)}
+
+def offer_for(version):
+    if version == SSL2:
+        return list(SSL2_CIPHER_SPECS)
+    if version == TLS13:
+        return list(TLS13_CIPHER_SUITES)
+    return list(CIPHER_SUITES)
+
+def _past(stop):
+    return stop is not None and time.monotonic() >= stop
+
+def _enumerate_group(connect, version, offer, server_name, stop):
+    """
+    Rounds over one group of suites. Returns (accepted, error, finished):
+    error is what failed the first round, finished is False if stop passed
+    before the server refused the rest.
+    """
+    offer = list(offer)
+    accepted = []
+    while offer:
+        if _past(stop):
+            return accepted, None, False
+        try:
+            with connect() as sock:
+                sock.sendall(build_client_hello(version, offer, server_name))
+                hello = read_server_hello(sock)
+        except (OSError, HelloError) as e:
+            # Once something was accepted, a failure just means the server is done with this group
+            return accepted, None if accepted else e, True
+        if hello is None or hello["version"] != version or hello["cipher"] not in offer:
+            break
+        accepted.append(hello["cipher"])
+        offer.remove(hello["cipher"])
+    return accepted, None, True
+
+def enumerate_version(connect, version, server_name=None, stop=None, groups=ENUMERATION_GROUPS):
+    """
+    List every suite the server accepts at one protocol version, as
+    (accepted, finished). The offer is split into disjoint groups enumerated
+    in parallel; in each, every round offers the suites not accepted yet and
+    the server's pick is removed, until it refuses the rest. No round starts
+    after stop (a time.monotonic() value); finished is then False and the
+    list holds what was learned so far. connect() must return a fresh plain
+    socket positioned where a ClientHello is expected, or a context manager
+    yielding one; it is closed when the exchange is over.
+    """
+    offer = offer_for(version)
+    if version == SSL2:
+        if _past(stop):
+            return [], False
+        # An SSLv2 server lists all of its ciphers in a single SERVER-HELLO
+        with connect() as sock:
+            sock.sendall(build_ssl2_client_hello(offer))
+            specs = read_ssl2_server_hello(sock)
+        return [spec for spec in offer if spec in (specs or [])], True
+
+    # Interleaved, so every group gets a mix of strong and weak suites
+    parts = [offer[i::groups] for i in range(min(groups, len(offer)))]
+    outcomes = [None] * len(parts)
+
+    def run(index):
+        try:
+            outcomes[index] = _enumerate_group(connect, version, parts[index], server_name, stop)
+        except Exception as e:
+            outcomes[index] = [], e, True
+
+    threads = [threading.Thread(target=run, args=(index,), daemon=True) for index in range(len(parts))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    found = {code for accepted, _, _ in outcomes for code in accepted}
+    errors = [error for _, error, _ in outcomes if error]
+    if not found and errors:
+        raise errors[0]
+    return [code for code in offer if code in found], all(finished for _, _, finished in outcomes)
+
+def enumerate_suites(connect, server_name=None, versions=None, stop=None):
+    """
+    Enumerate accepted suites for every protocol version, one thread per
+    version. Past stop no new connection is made and the result is partial.
+    """
+    result = SuiteEnumeration()
+    lock = threading.Lock()
+
+    def run(name):
+        try:
+            codes, finished = enumerate_version(connect, VERSIONS[name], server_name, stop)
+            with lock:
+                result.codes[name] = codes
+                if not finished:
+                    result.unfinished.add(name)
+        except Exception as e:
+            with lock:
+                result.errors[name] = e
+
+    threads = [threading.Thread(target=run, args=(name,), daemon=True) for name in (versions or VERSIONS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return result
@@ -35,10 +35,10 @@ function getKeyFromMemcached(keyName, req) {
 }
 
 // Function to store a key in Memcached
-async function storeKeyInMemcached(keyName, keyData, req) {
+async function storeKeyInMemcached(keyName, keyData, req, lifetime = 3600) {
   return new Promise((resolve, reject) => {
-    // Set the key in Memcached with a specific expiration time (e.g., 3600 seconds)
-    memcached.set(keyName, keyData, 3600, (err) => {
+    // Set the key in Memcached with a specific expiration time (in seconds)
+    memcached.set(keyName, keyData, lifetime, (err) => {
       if (err) {
         if (req) logError(req, "Error storing key in Memcached", err);
         reject(err);
@@ -49,4 +49,18 @@ async function storeKeyInMemcached(keyName, keyData, req) {
   });
 }
 
-module.exports = { getKeyFromMemcached, storeKeyInMemcached };
+// Function to remove a key from Memcached
+async function deleteKeyFromMemcached(keyName, req) {
+  return new Promise((resolve, reject) => {
+    memcached.del(keyName, (err) => {
+      if (err) {
+        if (req) logError(req, "Error deleting key from Memcached", err);
+        reject(err);
+      } else {
+        resolve(true);
+      }
+    });
+  });
+}
+
+module.exports = { getKeyFromMemcached, storeKeyInMemcached, deleteKeyFromMemcached };
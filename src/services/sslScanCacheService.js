@@ -0,0 +1,252 @@
+const crypto = require('crypto');
+const dns = require('dns').promises;
+const fs = require('fs').promises;
+const path = require('path');
+
+/**
+ * In-process LRU store. Map iteration order doubles as recency order.
+ */
+class MemoryLruStore {
+  constructor({ maxEntries = 500 } = {}) {
+    this.maxEntries = maxEntries;
+    this.entries = new Map();
+  }
+
+  async get(key) {
+    const item = this.entries.get(key);
+    if (!item) {
+      return null;
+    }
+    if (item.expiresAt <= Date.now()) {
+      this.entries.delete(key);
+      return null;
+    }
+    // Re-insert to mark as most recently used
+    this.entries.delete(key);
+    this.entries.set(key, item);
+    return item.value;
+  }
+
+  async set(key, value, ttlSeconds) {
+    this.entries.delete(key);
+    this.entries.set(key, { value, expiresAt: Date.now() + ttlSeconds * 1000 });
+    while (this.entries.size > this.maxEntries) {
+      this.entries.delete(this.entries.keys().next().value);
+    }
+  }
+
+  async delete(key) {
+    this.entries.delete(key);
+  }
+}
+
+/**
+ * One JSON file per key, named by the key's SHA-1 so any key is a safe filename.
+ * Expired files are removed when read, and by a sweep of the directory that a
+ * write starts at most once per sweep interval, for keys nobody reads again.
+ */
+class DiskStore {
+  constructor({ dir, sweepIntervalMs = 10 * 60 * 1000 }) {
+    this.dir = dir;
+    this.sweepIntervalMs = sweepIntervalMs;
+    this.lastSweep = Date.now();
+  }
+
+  fileFor(key) {
+    return path.join(this.dir, `${crypto.createHash('sha1').update(key).digest('hex')}.json`);
+  }
+
+  async get(key) {
+    const file = this.fileFor(key);
+    let item;
+    try {
+      item = JSON.parse(await fs.readFile(file, 'utf8'));
+    } catch (e) {
+      if (e instanceof SyntaxError) {
+        await fs.unlink(file).catch(() => {});
+      }
+      return null;
+    }
+    if (item.key !== key || item.expiresAt <= Date.now()) {
+      await fs.unlink(file).catch(() => {});
+      return null;
+    }
+    return item.value;
+  }
+
+  async set(key, value, ttlSeconds) {
+    await fs.mkdir(this.dir, { recursive: true });
+    // Write then rename so concurrent readers never see a half-written file
+    const file = this.fileFor(key);
+    const tmp = `${file}.${process.pid}.tmp`;
+    await fs.writeFile(tmp, JSON.stringify({ key, value, expiresAt: Date.now() + ttlSeconds * 1000 }));
+    await fs.rename(tmp, file);
+    if (Date.now() - this.lastSweep >= this.sweepIntervalMs) {
+      this.lastSweep = Date.now();
+      this.sweep().catch(() => {});
+    }
+  }
+
+  async delete(key) {
+    await fs.unlink(this.fileFor(key)).catch(() => {});
+  }
+
+  async sweep() {
+    const now = Date.now();
+    for (const name of await fs.readdir(this.dir)) {
+      if (!name.endsWith('.json')) {
+        continue;
+      }
+      const file = path.join(this.dir, name);
+      try {
+        if (JSON.parse(await fs.readFile(file, 'utf8')).expiresAt > now) {
+          continue;
+        }
+      } catch (e) {
+        if (!(e instanceof SyntaxError)) {
+          continue;
+        }
+      }
+      await fs.unlink(file).catch(() => {});
+    }
+  }
+}
+
+/**
+ * Store backed by the project's memcached instance.
+ */
+class MemcachedStore {
+  constructor() {
+    // Required lazily so the memcached client is only created when this store is used
+    const { getKeyFromMemcached, storeKeyInMemcached, deleteKeyFromMemcached } = require('./memcachedService');
+    this.getKey = getKeyFromMemcached;
+    this.storeKey = storeKeyInMemcached;
+    this.deleteKey = deleteKeyFromMemcached;
+  }
+
+  async get(key) {
+    return this.getKey(key).catch(() => null);
+  }
+
+  async set(key, value, ttlSeconds) {
+    await this.storeKey(key, JSON.stringify(value), null, ttlSeconds).catch(() => {});
+  }
+
+  async delete(key) {
+    await this.deleteKey(key).catch(() => {});
+  }
+}
+
+function createStore({ store = 'memory', maxEntries, dir } = {}) {
+  switch (store) {
+    case 'memory':
+      return new MemoryLruStore({ maxEntries });
+    case 'disk':
+      return new DiskStore({ dir });
+    case 'memcached':
+      return new MemcachedStore();
+    case 'none':
+      return null;
+    default:
+      throw new Error(`Unknown SSL scan cache store: ${store}`);
+  }
+}
+
+/**
+ * Cache around the SSL/TLS scanner.
+ *
+ * Entries are keyed by host, port and resolved IP. Within freshTtl a hit is
+ * confirmed with one cheap handshake: if the leaf certificate fingerprint
+ * changed (or the handshake fails) the target is rescanned immediately.
+ * Between freshTtl and freshTtl + staleTtl the cached result is returned as
+ * is and a rescan runs in the background. Concurrent lookups for the same
+ * key share a single in-flight scan.
+ */
+class SslScanCache {
+  constructor({ store, scan, fingerprint, resolve = defaultResolve, freshTtl = 3600, staleTtl = 86400 }) {
+    this.store = store;
+    this.scan = scan;
+    this.fingerprint = fingerprint;
+    this.resolve = resolve;
+    this.freshTtl = freshTtl;
+    this.staleTtl = staleTtl;
+    this.inflight = new Map();
+  }
+
+  /**
+   * @returns {Promise<{key: string, address: ?string}>} address is null if the host did not resolve
+   */
+  async keyFor(host, port) {
+    let address = null;
+    try {
+      address = await this.resolve(host);
+    } catch (e) {
+      // Unresolvable hosts still get scanned (and cached) under a placeholder address
+    }
+    return { key: `sslscan:${host.toLowerCase()}:${port}:${address || 'unresolved'}`, address };
+  }
+
+  /**
+   * @returns {Promise<{result: Object, cache: string}>} cache is 'hit', 'stale' or 'miss'
+   */
+  async get(host, port) {
+    if (!this.store) {
+      return { result: await this.scan(host, port), cache: 'miss' };
+    }
+    const { key, address } = await this.keyFor(host, port);
+    const entry = await this.store.get(key);
+    if (entry) {
+      const age = (Date.now() - entry.scannedAt) / 1000;
+      if (age < this.freshTtl) {
+        if (await this.fingerprintMatches(host, port, address, entry.fingerprint)) {
+          return { result: entry.result, cache: 'hit' };
+        }
+        await this.store.delete(key);
+      } else if (age < this.freshTtl + this.staleTtl) {
+        this.refresh(key, host, port, address).catch(() => {});
+        return { result: entry.result, cache: 'stale' };
+      }
+    }
+    return { result: await this.refresh(key, host, port, address), cache: 'miss' };
+  }
+
+  // The fingerprint handshake goes to the keyed address, so round-robin DNS cannot send it to another backend
+  async fingerprintMatches(host, port, address, expected) {
+    try {
+      return (await this.fingerprint(host, port, address)) === expected;
+    } catch (e) {
+      return false;
+    }
+  }
+
+  refresh(key, host, port, address) {
+    if (this.inflight.has(key)) {
+      return this.inflight.get(key);
+    }
+    const pending = (async () => {
+      const [result, fingerprint] = await Promise.all([
+        this.scan(host, port),
+        this.fingerprint(host, port, address).catch(() => null),
+      ]);
+      // Failed scans and endpoints without a certificate are not worth remembering
+      if (fingerprint && result && !result.error) {
+        // A store that cannot be written to should not turn a good scan into an error
+        await this.store
+          .set(key, { result, fingerprint, scannedAt: Date.now() }, this.freshTtl + this.staleTtl)
+          .catch(() => {});
+      }
+      return result;
+    })();
+    this.inflight.set(key, pending);
+    const clear = () => this.inflight.delete(key);
+    pending.then(clear, clear);
+    return pending;
+  }
+}
+
+async function defaultResolve(host) {
+  const { address } = await dns.lookup(host);
+  return address;
+}
+
+module.exports = { SslScanCache, MemoryLruStore, DiskStore, MemcachedStore, createStore };
@@ -1,50 +1,202 @@
 const { spawn } = require('child_process');
+const readline = require('readline');
+const config = require('../config/secureConfig');
+const { logger } = require('../utils/logger');
+const { SslScanCache, createStore } = require('./sslScanCacheService');
 
-async function runPythonVulnScanner(host, port) {
-  return new Promise((resolve, reject) => {
-    console.log(`Attempting to spawn python3 src/external/ssl_vuln_scanner.py ${host} ${port}`);
-    const proc = spawn('python3', [
-      'src/external/ssl_vuln_scanner.py',
-      host,
-      String(port)
-    ]);
-    let out = '';
-    let err = '';
-    proc.stdout.on('data', (data) => { out += data; });
-    proc.stderr.on('data', (data) => { err += data; });
-    proc.on('error', (error) => {
-      console.error(`Failed to start Python subprocess: ${error.message}`);
-      reject(new Error(`Failed to start Python subprocess: ${error.message}`));
+const SCANNER_PATH = 'src/external/ssl_vuln_scanner.py';
+// SERVE_MAX_JOBS in ssl_vuln_scanner.py: a worker does not read further jobs while this many are running
+const MAX_JOBS_PER_WORKER = 4;
+
+/**
+ * A long-lived `ssl_vuln_scanner.py --serve` process.
+ * Jobs are written to its stdin as NDJSON and matched to replies by id,
+ * so several scans can be in flight on one worker at the same time.
+ * onSettled is called whenever the worker may have room for another job.
+ */
+class ScannerWorker {
+  constructor(onSettled = () => {}) {
+    this.nextId = 1;
+    this.pending = new Map();
+    this.alive = true;
+    this.draining = false;
+    this.onSettled = onSettled;
+    this.stderr = '';
+
+    this.proc = spawn('python3', [SCANNER_PATH, '--serve']);
+    this.proc.stderr.on('data', (data) => {
+      // Keep only the tail so a chatty worker cannot grow memory without bound
+      this.stderr = (this.stderr + data).slice(-4096);
     });
-    proc.on('close', (code) => {
-      console.log(`Python script stdout: ${out}`);
-      console.log(`Python script stderr: ${err}`);
-      if (code !== 0) {
-        return reject(new Error(`Python vuln scanner exited with code ${code}: ${err}`));
-      }
-      try {
-        const results = JSON.parse(out);
-        console.log(`Parsed Python script results: ${JSON.stringify(results)}`);
-        resolve(results);
-      } catch (e) {
-        console.error(`Failed to parse Python vuln scanner output: ${e.message}`);
-        reject(new Error('Failed to parse Python vuln scanner output: ' + e.message));
-      }
+    this.proc.stdin.on('error', () => {
+      // Write failures surface through the 'close' handler below
     });
+    this.proc.on('error', (error) => {
+      this.fail(new Error(`Failed to start Python subprocess: ${error.message}`));
+    });
+    this.proc.on('close', (code) => {
+      this.fail(new Error(`Python vuln scanner exited with code ${code}: ${this.stderr}`));
+    });
+
+    readline.createInterface({ input: this.proc.stdout }).on('line', (line) => this.handleLine(line));
+  }
+
+  get load() {
+    return this.pending.size;
+  }
+
+  get available() {
+    return this.alive && !this.draining && this.pending.size < MAX_JOBS_PER_WORKER;
+  }
+
+  handleLine(line) {
+    let message;
+    try {
+      message = JSON.parse(line);
+    } catch (e) {
+      logger.error(`Failed to parse Python vuln scanner output: ${e.message}`);
+      return;
+    }
+    const job = this.pending.get(message.id);
+    if (!job) {
+      return;
+    }
+    this.pending.delete(message.id);
+    clearTimeout(job.timer);
+    if (message.error) {
+      job.reject(new Error(message.error));
+    } else {
+      job.resolve(message.result);
+    }
+    this.settled();
+  }
+
+  settled() {
+    // A draining worker is restarted once the jobs it still runs are done
+    if (this.draining && this.pending.size === 0) {
+      this.kill();
+    }
+    this.onSettled();
+  }
+
+  run(job) {
+    return new Promise((resolve, reject) => {
+      const id = this.nextId++;
+      const timer = setTimeout(() => {
+        // A job that outlives the scanner's own deadline means a scan is wedged. Fail only
+        // that job: the worker takes no new work and is restarted once its other jobs finish.
+        this.pending.delete(id);
+        reject(new Error(`Python vuln scanner timed out after ${config.sslScanner.jobTimeoutMs}ms`));
+        this.draining = true;
+        this.settled();
+      }, config.sslScanner.jobTimeoutMs);
+      this.pending.set(id, { resolve, reject, timer });
+      this.proc.stdin.write(`${JSON.stringify({ id, ...job })}\n`);
+    });
+  }
+
+  fail(error) {
+    this.alive = false;
+    for (const job of this.pending.values()) {
+      clearTimeout(job.timer);
+      job.reject(error);
+    }
+    this.pending.clear();
+    this.onSettled();
+  }
+
+  kill() {
+    this.alive = false;
+    this.proc.kill();
+  }
+}
+
+const workers = [];
+// Jobs waiting for a worker with a free slot; their timeout only starts once they are dispatched
+const queue = [];
+
+function acquireWorker() {
+  // Replace workers that died or are draining, then hand out the least busy one with room
+  for (let i = 0; i < workers.length; i++) {
+    if (!workers[i].alive) {
+      workers.splice(i--, 1);
+    }
+  }
+  while (workers.filter((worker) => !worker.draining).length < config.sslScanner.workers) {
+    workers.push(new ScannerWorker(dispatch));
+  }
+  return workers
+    .filter((worker) => worker.available)
+    .reduce((best, worker) => (!best || worker.load < best.load ? worker : best), null);
+}
+
+function dispatch() {
+  while (queue.length) {
+    const worker = acquireWorker();
+    if (!worker) {
+      return;
+    }
+    const { job, resolve, reject } = queue.shift();
+    worker.run(job).then(resolve, reject);
+  }
+}
+
+function runJob(job) {
+  return new Promise((resolve, reject) => {
+    queue.push({ job, resolve, reject });
+    dispatch();
   });
 }
 
+function shutdownScannerPool() {
+  while (queue.length) {
+    queue.shift().reject(new Error('SSL/TLS scanner pool was shut down'));
+  }
+  while (workers.length) {
+    workers.pop().kill();
+  }
+}
+
+async function runPythonVulnScanner(host, port) {
+  const job = { host, port: String(port) };
+  if (config.sslScanner.timings) {
+    job.timings = true;
+  }
+  const results = await runJob(job);
+  logger.debug(`Python vuln scanner results for ${host}:${port}: ${JSON.stringify(results)}`);
+  return results;
+}
+
+// A single baseline handshake (to address, when given); resolves to the leaf certificate's SHA-256 fingerprint
+async function runPythonFingerprint(host, port, address) {
+  const job = { op: 'fingerprint', host, port: String(port) };
+  if (address) {
+    job.address = address;
+  }
+  const { fingerprint } = await runJob(job);
+  return fingerprint;
+}
+
+const scanCache = new SslScanCache({
+  store: createStore(config.sslScanner.cache),
+  scan: runPythonVulnScanner,
+  fingerprint: runPythonFingerprint,
+  freshTtl: config.sslScanner.cache.freshTtl,
+  staleTtl: config.sslScanner.cache.staleTtl,
+});
+
 /**
  * Scan SSL/TLS configuration and vulnerabilities for a given host/port
  * @param {Object} options
  * @param {string} options.host - Hostname or IP
  * @param {number} [options.port=443] - Port (default 443)
- * @returns {Promise<Object>} Scan result
+ * @returns {Promise<Object>} Scan result (`cache` says whether it was a hit, stale or a miss)
  */
 async function scanSslTls({ host, port = 443 }) {
   let vulnerabilities = null;
+  let cache = 'miss';
   try {
-    vulnerabilities = await runPythonVulnScanner(host, port);
+    ({ result: vulnerabilities, cache } = await scanCache.get(host, port));
   } catch (e) {
     // Attempt to parse the error message from the Python script
     let errorMessage = e.message;
@@ -62,8 +214,9 @@ async function scanSslTls({ host, port = 443 }) {
     host,
     port,
     vulnerabilities,
+    cache,
     timestamp: new Date().toISOString(),
   };
 }
 
-module.exports = { scanSslTls }; 
\ No newline at end of file
+module.exports = { scanSslTls, shutdownScannerPool };
@@ -0,0 +1,154 @@
+const fs = require('fs');
+const os = require('os');
+const path = require('path');
+const { SslScanCache, MemoryLruStore, DiskStore } = require('../../../src/services/sslScanCacheService');
+
+function createCache(overrides = {}) {
+  const scan = jest.fn().mockImplementation(async (host, port) => ({ grade: 'A', host, port }));
+  const fingerprint = jest.fn().mockResolvedValue('fp-1');
+  const cache = new SslScanCache({
+    store: new MemoryLruStore({ maxEntries: 10 }),
+    scan,
+    fingerprint,
+    resolve: async () => '192.0.2.1',
+    freshTtl: 60,
+    staleTtl: 600,
+    ...overrides,
+  });
+  return { cache, scan, fingerprint };
+}
+
+describe('SSL Scan Cache Service', () => {
+  describe('MemoryLruStore', () => {
+    test('should evict the least recently used entry', async () => {
+      const store = new MemoryLruStore({ maxEntries: 2 });
+      await store.set('a', 1, 60);
+      await store.set('b', 2, 60);
+      await store.get('a');
+      await store.set('c', 3, 60);
+
+      expect(await store.get('a')).toBe(1);
+      expect(await store.get('b')).toBeNull();
+      expect(await store.get('c')).toBe(3);
+    });
+
+    test('should expire entries after their ttl', async () => {
+      const store = new MemoryLruStore();
+      await store.set('a', 1, 0);
+
+      expect(await store.get('a')).toBeNull();
+    });
+  });
+
+  describe('DiskStore', () => {
+    let dir;
+
+    beforeEach(() => {
+      dir = fs.mkdtempSync(path.join(os.tmpdir(), 'ssl-scan-cache-'));
+    });
+
+    afterEach(() => {
+      fs.rmSync(dir, { recursive: true, force: true });
+    });
+
+    test('should return a stored value and remove the file once it expires', async () => {
+      const store = new DiskStore({ dir });
+      await store.set('a', { grade: 'A' }, 60);
+      await store.set('b', 2, 0);
+
+      expect(await store.get('a')).toEqual({ grade: 'A' });
+      expect(await store.get('b')).toBeNull();
+      expect(fs.existsSync(store.fileFor('a'))).toBe(true);
+      expect(fs.existsSync(store.fileFor('b'))).toBe(false);
+    });
+
+    test('should sweep expired entries that are never read again', async () => {
+      const store = new DiskStore({ dir });
+      await store.set('fresh', 1, 60);
+      await store.set('expired', 2, 0);
+      fs.writeFileSync(path.join(dir, 'corrupt.json'), '{');
+
+      await store.sweep();
+
+      expect(fs.readdirSync(dir)).toEqual([path.basename(store.fileFor('fresh'))]);
+    });
+  });
+
+  describe('SslScanCache', () => {
+    test('should scan on a miss and serve a hit when the fingerprint is unchanged', async () => {
+      const { cache, scan, fingerprint } = createCache();
+
+      const first = await cache.get('example.com', 443);
+      const second = await cache.get('example.com', 443);
+
+      expect(first.cache).toBe('miss');
+      expect(second.cache).toBe('hit');
+      expect(second.result).toEqual(first.result);
+      expect(scan).toHaveBeenCalledTimes(1);
+      expect(fingerprint).toHaveBeenCalledTimes(2);
+    });
+
+    test('should rescan when the certificate fingerprint changes', async () => {
+      const { cache, scan, fingerprint } = createCache();
+
+      await cache.get('example.com', 443);
+      fingerprint.mockResolvedValue('fp-2');
+      const result = await cache.get('example.com', 443);
+
+      expect(result.cache).toBe('miss');
+      expect(scan).toHaveBeenCalledTimes(2);
+    });
+
+    test('should share one in-flight scan between concurrent requests', async () => {
+      const { cache, scan } = createCache();
+
+      const results = await Promise.all([
+        cache.get('example.com', 443),
+        cache.get('example.com', 443),
+        cache.get('example.com', 443),
+      ]);
+
+      expect(scan).toHaveBeenCalledTimes(1);
+      results.forEach((r) => expect(r.result.grade).toBe('A'));
+    });
+
+    test('should serve stale results while rescanning in the background', async () => {
+      const { cache, scan } = createCache({ freshTtl: 0 });
+
+      await cache.get('example.com', 443);
+      const stale = await cache.get('example.com', 443);
+
+      expect(stale.cache).toBe('stale');
+      expect(scan).toHaveBeenCalledTimes(2);
+    });
+
+    test('should key entries by port and resolved address', async () => {
+      const { cache, scan } = createCache();
+
+      await cache.get('example.com', 443);
+      await cache.get('example.com', 8443);
+
+      expect(scan).toHaveBeenCalledTimes(2);
+    });
+
+    test('should check the fingerprint on the address the entry was keyed by', async () => {
+      const { cache, fingerprint } = createCache();
+
+      await cache.get('example.com', 443);
+      await cache.get('example.com', 443);
+
+      expect(fingerprint).toHaveBeenCalledWith('example.com', 443, '192.0.2.1');
+      expect(fingerprint).toHaveBeenCalledTimes(2);
+    });
+
+    test('should not cache failed scans', async () => {
+      const { cache, scan } = createCache();
+      scan.mockResolvedValue({ error: 'Connection refused' });
+
+      await cache.get('example.com', 443);
+      await cache.get('example.com', 443);
+
+      expect(scan).toHaveBeenCalledTimes(2);
+    });
+  });
+});
@@ -0,0 +1,93 @@
+jest.mock('child_process', () => ({
+  spawn: jest.fn(),
+}));
+
+jest.mock('../../../src/config/secureConfig', () => ({
+  sslScanner: { workers: 1, jobTimeoutMs: 1000, timings: false, cache: { store: 'none' } },
+}));
+
+jest.mock('../../../src/utils/logger', () => ({
+  logger: { debug: jest.fn(), error: jest.fn() },
+}));
+
+const { EventEmitter } = require('events');
+const { PassThrough } = require('stream');
+const { spawn } = require('child_process');
+const config = require('../../../src/config/secureConfig');
+const { scanSslTls, shutdownScannerPool } = require('../../../src/services/sslTlsScannerService');
+
+// Stand-in for a `--serve` worker: records the jobs written to it and replies on demand
+function createFakeWorker() {
+  const proc = new EventEmitter();
+  proc.stdout = new PassThrough();
+  proc.stderr = new PassThrough();
+  proc.jobs = [];
+  proc.stdin = { on: jest.fn(), write: (line) => proc.jobs.push(JSON.parse(line)) };
+  proc.kill = jest.fn(() => proc.emit('close', null));
+  proc.reply = (job) => proc.stdout.write(`${JSON.stringify({ id: job.id, result: { grade: 'A' } })}\n`);
+  return proc;
+}
+
+const flush = () => new Promise((resolve) => setImmediate(resolve));
+const sleep = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
+
+describe('SSL/TLS Scanner Service', () => {
+  let procs;
+
+  beforeEach(() => {
+    jest.clearAllMocks();
+    config.sslScanner.jobTimeoutMs = 1000;
+    procs = [];
+    spawn.mockImplementation(() => {
+      const proc = createFakeWorker();
+      procs.push(proc);
+      return proc;
+    });
+  });
+
+  afterEach(() => {
+    shutdownScannerPool();
+  });
+
+  test('should queue jobs beyond the worker limit until a slot frees up', async () => {
+    const scans = [1, 2, 3, 4, 5].map((i) => scanSslTls({ host: `host${i}.example.com` }));
+    await flush();
+
+    expect(procs).toHaveLength(1);
+    expect(procs[0].jobs).toHaveLength(4);
+
+    procs[0].reply(procs[0].jobs[0]);
+    await flush();
+    await flush();
+
+    expect(procs[0].jobs).toHaveLength(5);
+
+    procs[0].jobs.slice(1).forEach((job) => procs[0].reply(job));
+    const results = await Promise.all(scans);
+    results.forEach((result) => expect(result.vulnerabilities).toEqual({ grade: 'A' }));
+  });
+
+  test('should fail only the timed out job and restart the worker once it drains', async () => {
+    config.sslScanner.jobTimeoutMs = 100;
+    const wedged = scanSslTls({ host: 'wedged.example.com' });
+    await sleep(60);
+    const healthy = scanSslTls({ host: 'healthy.example.com' });
+    await sleep(60);
+
+    expect((await wedged).vulnerabilities.error).toMatch(/timed out/);
+    expect(procs[0].kill).not.toHaveBeenCalled();
+
+    // New work goes to a replacement worker while the first one drains
+    const next = scanSslTls({ host: 'next.example.com' });
+    await flush();
+    expect(procs).toHaveLength(2);
+    expect(procs[1].jobs).toHaveLength(1);
+
+    procs[0].reply(procs[0].jobs[1]);
+    expect((await healthy).vulnerabilities).toEqual({ grade: 'A' });
+    expect(procs[0].kill).toHaveBeenCalled();
+
+    procs[1].reply(procs[1].jobs[0]);
+    expect((await next).vulnerabilities).toEqual({ grade: 'A' });
+  });
+});